@@ -1,8 +1,28 @@
-import requests
+import codecs
+import gzip
+import hashlib
 import json
 import os
+import threading
 import time
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from data_access import (data_access, project_item, record_file_names, catalog_path, iter_catalog_file, load_catalog_meta,
+                         CATALOG_META_FILE, COMPRESS_RECORDS)
+from profiling import profiler
+
+DATA_FILES = {
+    'dofus_resources.json': 'https://api.dofusdu.de/dofus2/en/items/resources/all?sort%5Blevel%5D=desc',
+    'dofus_consumables.json': 'https://api.dofusdu.de/dofus2/en/items/consumables/all?sort%5Blevel%5D=desc',
+    'dofus_equipment.json': 'https://api.dofusdu.de/dofus2/en/items/equipment/all?sort%5Blevel%5D=desc'
+}
+CHUNK_SIZE = 64 * 1024
+PROGRESS_STEP = 512 * 1024
+REQUEST_TIMEOUT = (10, 60)  # connect, read (seconds)
+CHECK_INTERVAL = 24 * 3600  # Seconds before a catalog is checked against the server again
+# Characters that can extend a number, so a number right before one of them may continue in the next chunk
+NUMBER_CONTINUATION = frozenset('0123456789.eE+-')
 
 def get_data_dir():
     if getattr(sys, 'frozen', False):
@@ -19,42 +39,287 @@ def check_files_exist():
         'dofus_consumables.json',
         'dofus_equipment.json'
     ]
-    return all(os.path.exists(os.path.join(data_dir, filename)) for filename in data_files)
+    return all(os.path.exists(catalog_path(data_dir, filename)) for filename in data_files)
 
-def check_file_age(filename):
+def check_file_age(filename, meta=None):
+    # meta is the file's entry in the catalog meta, which records when it was last checked, so a 304
+    # never has to touch the file itself
     data_dir = get_data_dir()
-    file_path = os.path.join(data_dir, filename)
+    file_path = catalog_path(data_dir, filename)
     if not os.path.exists(file_path):
         return True
-    current_time = time.time()
-    file_age = current_time - os.path.getmtime(file_path)
-    return file_age > 24 * 3600  # 24 hours in seconds
+    checked_at = (meta or {}).get('checked_at')
+    if checked_at is None:
+        # Downloaded before check times were recorded
+        checked_at = os.path.getmtime(file_path)
+    return time.time() - checked_at > CHECK_INTERVAL
+
+def create_session(pool_size=len(DATA_FILES)):
+    # One pooled session shared by every download thread. requests is imported here because it
+    # takes longer to import than the rest of the app, and only an update needs it.
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip'
+    return session
+
+def save_catalog_meta(meta):
+    meta_path = os.path.join(get_data_dir(), CATALOG_META_FILE)
+    with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(meta_path + '.tmp', meta_path)
+
+def encode_record(item):
+    return json.dumps(item, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+def record_digest(line):
+    return hashlib.blake2b(line.encode('utf-8'), digest_size=16).digest()
+
+def read_catalog_digests(file_path):
+    # ankama_id -> digest of its record, so a diff never holds two copies of the catalog; unreadable counts as empty
+    try:
+        return {item['ankama_id']: record_digest(encode_record(item)) for item in iter_catalog_file(file_path)}
+    except (FileNotFoundError, json.JSONDecodeError, EOFError, OSError):
+        return {}
+
+def diff_catalogs(old_digests, new_digests):
+    return {
+        'added': [ankama_id for ankama_id in new_digests if ankama_id not in old_digests],
+        'removed': [ankama_id for ankama_id in old_digests if ankama_id not in new_digests],
+        'changed': [ankama_id for ankama_id, digest in new_digests.items()
+                    if ankama_id in old_digests and old_digests[ankama_id] != digest]
+    }
+
+def iter_json_array(chunks, key='items'):
+    # Yields the elements of the top-level array under key as the bytes arrive, so the document is never held whole
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    pos = 0
+    done = False
+
+    def read_more():
+        nonlocal buffer, pos, done
+        if done:
+            raise json.JSONDecodeError("Unexpected end of document", buffer, len(buffer))
+        chunk = next(chunks, None)
+        if chunk is None:
+            done = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+
+    def peek():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            read_more()
+
+    def expect(chars):
+        nonlocal pos
+        char = peek()
+        if char not in chars:
+            raise json.JSONDecodeError(f"Expected one of {chars!r}", buffer, pos)
+        pos += 1
+        return char
+
+    def read_value():
+        nonlocal pos
+        peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number cut off by the end of a chunk still decodes, as '-5' from '-5.' or '1' from '1e',
+                # so wait until something that cannot continue it follows
+                cut = (isinstance(value, (int, float)) and not isinstance(value, bool)
+                       and (end == len(buffer) or buffer[end] in NUMBER_CONTINUATION))
+                if done or (end < len(buffer) and not cut):
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if done:
+                    raise
+            read_more()
+
+    expect('{')
+    if peek() == '}':
+        return
+    while True:
+        name = read_value()
+        expect(':')
+        if name == key:
+            expect('[')
+            if peek() == ']':
+                pos += 1
+            else:
+                while True:
+                    yield read_value()
+                    if expect(',]') == ']':
+                        break
+        else:
+            read_value()
+        if expect(',}') == '}':
+            return
+
+def download_file(session, url, file_path, progress_callback=None, validators=None):
+    # Parse items out of the body as it streams in and write one compact record per line to a temporary
+    # file, renamed over the old catalog once complete. Returns (validators, ankama_id -> record digest,
+    # digest of the whole file's records), or None when the server answered 304 Not Modified.
+    headers = {}
+    if validators and os.path.exists(file_path):
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    temp_path = file_path + '.part'
+    digests = {}
+    content_digest = hashlib.blake2b(digest_size=16)
+    try:
+        with session.get(url, stream=True, timeout=REQUEST_TIMEOUT, headers=headers) as response:
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            new_validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified')
+            }
+            received = 0
+
+            def chunks():
+                nonlocal received
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    received += len(chunk)
+                    if progress_callback:
+                        progress_callback(received)
+                    yield chunk
 
-def update_json_file(url, filename):
+            opener = gzip.open if file_path.endswith('.gz') else open
+            with opener(temp_path, 'wt', encoding='utf-8', newline='\n') as f:
+                for item in iter_json_array(chunks()):
+                    line = encode_record(project_item(item))
+                    digests[item['ankama_id']] = record_digest(line)
+                    content_digest.update(line.encode('utf-8') + b'\n')
+                    f.write(line + '\n')
+        os.replace(temp_path, file_path)
+        if profiler.enabled:
+            profiler.count('api_importer.bytes_received', received)
+            profiler.count('api_importer.items_written', len(digests))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return new_validators, digests, content_digest.hexdigest()
+
+def update_json_file(url, filename, session=None, progress_callback=None, meta=None):
+    # meta is the file's entry in the catalog meta from the last update.
+    # Returns {'status': 'updated' | 'not_modified' | 'fresh', 'meta': its new entry, 'diff': ...}
     data_dir = get_data_dir()
-    file_path = os.path.join(data_dir, filename)
-    if check_file_age(filename):
-        headers = {'Accept-Encoding': 'gzip'}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        os.makedirs(data_dir, exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(response.json(), f, ensure_ascii=False, indent=2)
-        print(f"Updated {filename}")
-    else:
+    file_path = catalog_path(data_dir, filename)
+    if not check_file_age(filename, meta):
         print(f"{filename} is up to date")
+        return {'status': 'fresh', 'meta': meta, 'diff': None}
 
-def update_dofus_data(status_callback=None):
-    data_files = {
-        'dofus_resources.json': 'https://api.dofusdu.de/dofus2/en/items/resources/all?sort%5Blevel%5D=desc',
-        'dofus_consumables.json': 'https://api.dofusdu.de/dofus2/en/items/consumables/all?sort%5Blevel%5D=desc',
-        'dofus_equipment.json': 'https://api.dofusdu.de/dofus2/en/items/equipment/all?sort%5Blevel%5D=desc'
-    }
+    os.makedirs(data_dir, exist_ok=True)
+    old_digests = read_catalog_digests(file_path)
+    compressed_name, plain_name = record_file_names(filename)
+    record_path = os.path.join(data_dir, compressed_name if COMPRESS_RECORDS else plain_name)
+    # A catalog still in another on-disk form is fetched in full so it gets rewritten
+    conditional = meta if file_path == record_path else None
+    checked_at = time.time()
+    with profiler.span('api_importer.download'):
+        if session is None:
+            with create_session(1) as own_session:
+                downloaded = download_file(own_session, url, record_path, progress_callback, conditional)
+        else:
+            downloaded = download_file(session, url, record_path, progress_callback, conditional)
+
+    if downloaded is None:
+        # Unchanged upstream: restart the 24 hour clock and leave the file, and everything built from it, alone
+        print(f"{filename} not modified")
+        return {'status': 'not_modified', 'meta': dict(meta or {}, checked_at=checked_at), 'diff': None}
+
+    new_validators, new_digests, content_digest = downloaded
+    # Only one form of each catalog stays on disk, so catalog_path always finds the one just written
+    for stale_name in (compressed_name, plain_name, filename):
+        stale_path = os.path.join(data_dir, stale_name)
+        if stale_path != record_path and os.path.exists(stale_path):
+            os.remove(stale_path)
+
+    # DataAccess signs the catalog with this digest while the file's name, size and mtime still match, so
+    # a download whose records are unchanged leaves the snapshot, database and saved plan valid
+    stat = os.stat(record_path)
+    new_meta = dict(new_validators, checked_at=checked_at, digest=content_digest,
+                    file=os.path.basename(record_path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    diff = diff_catalogs(old_digests, new_digests)
+    print(f"Updated {filename}: {len(diff['added'])} added, {len(diff['removed'])} removed, {len(diff['changed'])} changed")
+    return {'status': 'updated', 'meta': new_meta, 'diff': diff}
+
+def update_dofus_data(status_callback=None, data_files=None):
+    data_files = data_files or DATA_FILES
+
+    progress = {filename: "waiting" for filename in data_files}
+    progress_lock = threading.Lock()
 
-    for filename, url in data_files.items():
+    def report(filename, state):
+        with progress_lock:
+            progress[filename] = state
+            message = "Updating " + ", ".join(f"{name}: {value}" for name, value in progress.items())
         if status_callback:
-            status_callback(f"Updating {filename}...")
-        update_json_file(url, filename)
+            status_callback(message)
+
+    def file_progress(filename):
+        next_report = [0]
+        def callback(received):
+            if received >= next_report[0]:
+                next_report[0] = received + PROGRESS_STEP
+                report(filename, f"{received / (1024 * 1024):.1f} MB")
+        return callback
+
+    # All downloads run at once, so a refresh takes about as long as the slowest file
+    meta = load_catalog_meta(get_data_dir())
+    diffs = {}
+    with create_session(len(data_files)) as session, ThreadPoolExecutor(max_workers=len(data_files)) as executor:
+        futures = {
+            executor.submit(update_json_file, url, filename, session, file_progress(filename), meta.get(filename)): filename
+            for filename, url in data_files.items()
+        }
+        for future in as_completed(futures):
+            filename = futures[future]
+            result = future.result()
+            if result['meta']:
+                meta[filename] = result['meta']
+            if result['diff'] is not None:
+                diffs[filename] = result['diff']
+            report(filename, {'updated': "done", 'not_modified': "not modified", 'fresh': "up to date"}[result['status']])
+    save_catalog_meta(meta)
+
+    # A 200 whose items match the old file leaves every derived structure valid
+    updated = any(diff['added'] or diff['removed'] or diff['changed'] for diff in diffs.values())
+
+    # Drop cached catalogs and indexes so the next lookup sees the new files
+    data_access.reload()
+
+    if updated or not data_access.snapshot_is_current():
+        if status_callback:
+            status_callback("Building catalog snapshot...")
+        data_access.write_snapshot()
+
+    if data_access.backend == 'sqlite' and (updated or not data_access.database_is_current()):
+        if status_callback:
+            status_callback("Building catalog database...")
+        data_access.write_database()
 
     if status_callback:
-        status_callback("Data update complete")
\ No newline at end of file
+        status_callback("Data update complete")
+
+    return diffs
\ No newline at end of file
@@ -0,0 +1,374 @@
+import argparse
+import csv
+import http.client
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from calculator import CraftCalculator
+from data_access import data_access, CATALOG_FILES
+from price_import import read_prices
+from utils import process_recipe
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SYLLABLES = ['bou', 'ftou', 'gob', 'ball', 'tofu', 'ar', 'ak', 'mo', 'kwak', 'dra', 'gon', 'ette', 'pi', 'wi',
+             'cra', 'sa', 'dida', 'eni', 'ri', 'psa', 'ro', 'sram', 'feca', 'osa', 'mu', 'lou', 'zo', 'bal']
+TYPES = ['Hat', 'Cloak', 'Amulet', 'Ring', 'Belt', 'Boots', 'Shield', 'Sword', 'Bow', 'Staff']
+RESOURCE_TYPES = ['Wood', 'Ore', 'Cereal', 'Plant', 'Fish', 'Leather', 'Wool', 'Alloy', 'Plank']
+
+def make_name(rng, ankama_id):
+    words = [''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(rng.randint(1, 3))]
+    return ' '.join(words).capitalize() + f" {ankama_id}"
+
+def generate_catalog(size, depth, fanout, seed=0):
+    # API-shaped items: raw resources at the bottom, depth - 1 layers of craftable resources above them,
+    # equipment on top, plus a few consumables. Every recipe draws fanout ingredients from lower layers.
+    rng = random.Random(seed)
+    equipment_count = max(1, size * 3 // 10)
+    consumable_count = max(1, size // 20)
+    resource_count = max(fanout, size - equipment_count - consumable_count)
+    layer_sizes = [resource_count // 2] + [max(1, (resource_count - resource_count // 2) // max(1, depth - 1))] * (depth - 1)
+    layer_sizes[0] += resource_count - sum(layer_sizes)
+
+    next_id = 1
+    layers = []
+    resources = []
+
+    def recipe(rng):
+        # Mostly the layer right below, sometimes any lower layer, so the graph is a DAG of the given depth
+        ingredients = []
+        for _ in range(fanout):
+            layer = layers[-1] if rng.random() < 0.7 else rng.choice(layers)
+            ingredients.append({'item_ankama_id': rng.choice(layer), 'quantity': rng.randint(1, 10), 'item_subtype': 'resources'})
+        return ingredients
+
+    for layer_size in layer_sizes:
+        layer = []
+        for _ in range(layer_size):
+            item = {
+                'ankama_id': next_id,
+                'name': make_name(rng, next_id),
+                'level': rng.randint(1, 200),
+                'type': {'name': rng.choice(RESOURCE_TYPES), 'id': 1},
+                'item_subtype': 'resources',
+                'description': 'Synthetic resource',
+                'image_urls': {'icon': f"https://example.invalid/{next_id}.png"},
+                'recipe': recipe(rng) if layers else None
+            }
+            resources.append(item)
+            layer.append(next_id)
+            next_id += 1
+        layers.append(layer)
+
+    def crafted(count, subtype, types):
+        nonlocal next_id
+        items = []
+        for _ in range(count):
+            items.append({
+                'ankama_id': next_id,
+                'name': make_name(rng, next_id),
+                'level': rng.randint(1, 200),
+                'type': {'name': rng.choice(types), 'id': 2},
+                'item_subtype': subtype,
+                'description': 'Synthetic item',
+                'image_urls': {'icon': f"https://example.invalid/{next_id}.png"},
+                'effects': [{'int_minimum': 1, 'int_maximum': 50, 'type': {'name': 'Vitality', 'id': 125}}],
+                'recipe': recipe(rng)
+            })
+            next_id += 1
+        return items
+
+    return {
+        'dofus_resources.json': {'items': resources},
+        'dofus_equipment.json': {'items': crafted(equipment_count, 'equipment', TYPES)},
+        'dofus_consumables.json': {'items': crafted(consumable_count, 'consumables', ['Potion', 'Bread'])}
+    }
+
+def write_catalog(catalog, directory):
+    for file_name, data in catalog.items():
+        with open(os.path.join(directory, file_name), 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_size(size, depth, fanout, repeat, queries, lookups, roots, seed):
+    catalog = generate_catalog(size, depth, fanout, seed)
+    rng = random.Random(seed + 1)
+    all_items = [item for data in catalog.values() for item in data['items']]
+    equipment = catalog['dofus_equipment.json']['items']
+    lookup_ids = [rng.choice(all_items)['ankama_id'] for _ in range(lookups)]
+    lookup_names = [rng.choice(all_items)['name'] for _ in range(lookups)]
+    search_terms = ['a', 'bo', 'tofu', 'kwak gob'] + [rng.choice(equipment)['name'] for _ in range(queries)] + ['zzzz']
+    root_names = [item['name'] for item in rng.sample(equipment, min(roots, len(equipment)))]
+    item_count = len(all_items)
+    del all_items, equipment
+
+    results = []
+
+    def record(name, operations, timings):
+        results.append({
+            'size': size,
+            'benchmark': name,
+            'operations': operations,
+            'min_s': min(timings),
+            'median_s': statistics.median(timings),
+            'mean_s': statistics.fmean(timings),
+            'ops_per_s': operations / min(timings) if min(timings) else None
+        })
+        logger.info(f"{size:>9} {name:<24} {min(timings) * 1000:10.2f} ms (min of {len(timings)})")
+
+    with synthetic_data_dir(catalog):
+        del catalog
+        run_benchmarks(record, item_count, lookup_ids, lookup_names, search_terms, root_names, repeat)
+    return results
+
+@contextmanager
+def synthetic_data_dir(catalog):
+    # Points the shared data_access at a temporary copy of the catalog for the duration
+    original_data_dir = data_access.data_dir
+    with tempfile.TemporaryDirectory(prefix='craftimizer-bench-') as directory:
+        write_catalog(catalog, directory)
+        data_access.data_dir = directory
+        data_access.reload()
+        try:
+            yield directory
+        finally:
+            data_access.data_dir = original_data_dir
+            data_access.reload()
+
+def run_benchmarks(record, item_count, lookup_ids, lookup_names, search_terms, root_names, repeat):
+    def cold_load():
+        data_access.reload()
+        for file_name in CATALOG_FILES:
+            data_access._load_catalog_file(file_name)
+    record('load_catalog_cold', item_count, measure(cold_load, repeat))
+
+    def build_indexes():
+        data_access._id_index = None
+        data_access._name_indexes = {}
+        data_access._name_lookup = None
+        data_access._get_id_index()
+        data_access._get_name_index('dofus_equipment.json')
+        data_access._get_name_lookup()
+    record('build_indexes', item_count, measure(build_indexes, repeat))
+
+    def warm_up():
+        data_access.reload()
+        data_access.warm_up()
+    record('warm_up', item_count, measure(warm_up, repeat))
+
+    record('search_items', len(search_terms), measure(
+        lambda: [data_access.search_items('dofus_equipment.json', term) for term in search_terms], repeat))
+    record('find_item_by_id', len(lookup_ids), measure(
+        lambda: [data_access.find_item_by_id(ankama_id) for ankama_id in lookup_ids], repeat))
+    record('find_item_by_name', len(lookup_names), measure(
+        lambda: [data_access.find_item_by_name(name) for name in lookup_names], repeat))
+
+    recipes = [item.recipe for item in data_access.search_items('dofus_equipment.json', '')]
+    record('process_recipe', len(recipes), measure(lambda: [process_recipe(recipe, 3) for recipe in recipes], repeat))
+
+    def calculate():
+        calculator = CraftCalculator()
+        calculator.use_bom = False
+        calculator.calculate_rows([(name, 1) for name in root_names])
+    record('calculate_item_cost', len(root_names), measure(calculate, repeat))
+
+    # Half the rows by ankama_id and half by name, the way a market export mixes them
+    price_file = os.path.join(data_access.data_dir, 'prices.csv')
+    with open(price_file, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['ankama_id', 'name', 'price'])
+        for position, (ankama_id, name) in enumerate(zip(lookup_ids, lookup_names)):
+            writer.writerow([ankama_id, '', position + 1] if position % 2 else ['', name, f"{position + 1:,}"])
+    record('import_prices', len(lookup_ids), measure(lambda: read_prices(price_file), repeat))
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        logger.warning("NumPy is not installed, skipping the bill-of-materials benchmark")
+    else:
+        # Flattening the catalog is timed once; the cost runs reuse the cached bill of materials
+        calculator = CraftCalculator()
+        calculator.use_bom = True
+        record('bom_build', item_count, measure(calculator.get_bill_of_materials, 1))
+        record('calculate_costs_bom', len(root_names), measure(lambda: calculator.calculate_rows([(name, 1) for name in root_names]), repeat))
+
+SERVER_REQUESTS = ('search', 'item', 'costs')
+
+def server_client(port, request_count, search_terms, item_ids, cost_batches, seed):
+    # Runs in its own process, so client-side work does not compete with the server for the GIL.
+    # Returns request kind -> latencies in seconds, all over one keep-alive connection.
+    rng = random.Random(seed)
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies = {kind: [] for kind in SERVER_REQUESTS}
+    try:
+        for position in range(request_count):
+            kind = SERVER_REQUESTS[position % len(SERVER_REQUESTS)]
+            body = None
+            if kind == 'search':
+                path = '/search?' + urlencode({'q': rng.choice(search_terms)})
+            elif kind == 'item':
+                path = f"/items/{rng.choice(item_ids)}"
+            else:
+                path = '/costs'
+                body = json.dumps(rng.choice(cost_batches)).encode('utf-8')
+            start = time.perf_counter()
+            connection.request('POST' if body else 'GET', path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            latencies[kind].append(time.perf_counter() - start)
+            if response.status != 200:
+                raise RuntimeError(f"{path} answered {response.status}")
+    finally:
+        connection.close()
+    return latencies
+
+def run_server_size(size, depth, fanout, clients, request_count, workers, seed):
+    # Requests per second from concurrent keep-alive clients against a localhost server on the synthetic catalog
+    from server import CraftimizerAPI, CraftimizerServer
+
+    catalog = generate_catalog(size, depth, fanout, seed)
+    rng = random.Random(seed + 2)
+    resources = catalog['dofus_resources.json']['items']
+    equipment = catalog['dofus_equipment.json']['items']
+    search_terms = ['bo', 'tofu', 'kwak gob'] + [rng.choice(equipment)['name'][:8] for _ in range(20)]
+    item_ids = [rng.choice(equipment + resources)['ankama_id'] for _ in range(1000)]
+    cost_batches = [{
+        'items': [{'ankama_id': item['ankama_id'], 'amount': rng.randint(1, 10), 'sell_price': rng.randint(1000, 100000)}
+                  for item in rng.sample(equipment, min(10, len(equipment)))],
+        'prices': {str(item['ankama_id']): rng.randint(1, 500) for item in rng.sample(resources, min(50, len(resources)))}
+    } for _ in range(20)]
+
+    results = []
+    with synthetic_data_dir(catalog):
+        del catalog, resources, equipment
+        server = CraftimizerServer(('127.0.0.1', 0), CraftimizerAPI(), workers)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            port = server.server_address[1]
+            per_client = max(1, request_count // clients)
+            with ProcessPoolExecutor(max_workers=clients) as executor:
+                # One request per client first, so process start-up stays out of the timing
+                list(executor.map(server_client, *zip(*[(port, 1, search_terms, item_ids, cost_batches, seed)] * clients)))
+                start = time.perf_counter()
+                runs = list(executor.map(server_client, *zip(*[
+                    (port, per_client, search_terms, item_ids, cost_batches, seed + client) for client in range(clients)
+                ])))
+                elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def record(name, latencies, seconds):
+        latencies = sorted(latencies)
+        results.append({
+            'size': size,
+            'benchmark': name,
+            'operations': len(latencies),
+            'clients': clients,
+            'elapsed_s': seconds,
+            'ops_per_s': len(latencies) / seconds if seconds else None,
+            'latency_p50_s': latencies[len(latencies) // 2],
+            'latency_p99_s': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)]
+        })
+        logger.info(f"{size:>9} {name:<24} {len(latencies) / seconds:10.1f} req/s  "
+                    f"p50 {latencies[len(latencies) // 2] * 1000:.2f} ms")
+
+    record('server_total', [latency for run in runs for latencies in run.values() for latency in latencies], elapsed)
+    for kind in SERVER_REQUESTS:
+        record(f"server_{kind}", [latency for run in runs for latency in run[kind]], elapsed)
+    return results
+
+def compare(baseline, current):
+    # Ratio of current to baseline per (size, benchmark): min time, or throughput for the server runs.
+    # Above 1 is slower either way.
+    previous = {(result['size'], result['benchmark']): result for result in baseline['results']}
+    lines = []
+    for result in current['results']:
+        before = previous.get((result['size'], result['benchmark']))
+        if not before:
+            continue
+        if before.get('min_s') and 'min_s' in result:
+            ratio = result['min_s'] / before['min_s']
+            lines.append(f"{result['size']:>9} {result['benchmark']:<24} {before['min_s'] * 1000:10.2f} ms -> "
+                         f"{result['min_s'] * 1000:10.2f} ms  x{ratio:.2f}")
+        elif before.get('ops_per_s') and result.get('ops_per_s'):
+            ratio = before['ops_per_s'] / result['ops_per_s']
+            lines.append(f"{result['size']:>9} {result['benchmark']:<24} {before['ops_per_s']:10.1f}/s -> "
+                         f"{result['ops_per_s']:10.1f}/s  x{ratio:.2f}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time catalog loading, lookups and cost computation on synthetic catalogs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="catalog sizes in items (default: 10000 100000)")
+    parser.add_argument('--depth', type=int, default=3, help="recipe depth, counting the equipment layer (default: 3)")
+    parser.add_argument('--fanout', type=int, default=4, help="ingredients per recipe (default: 4)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per benchmark; the minimum is reported (default: 5)")
+    parser.add_argument('--queries', type=int, default=20, help="full-name searches on top of the fixed short terms")
+    parser.add_argument('--lookups', type=int, default=10000, help="ids and names looked up per run")
+    parser.add_argument('--roots', type=int, default=200, help="equipment rows priced per cost run")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--server', action='store_true', help="measure HTTP server throughput instead of the engine")
+    parser.add_argument('--clients', type=int, default=4, help="concurrent client processes for --server (default: 4)")
+    parser.add_argument('--requests', type=int, default=600, help="requests across all clients for --server (default: 600)")
+    parser.add_argument('--workers', type=int, default=16, help="server request threads for --server (default: 16)")
+    parser.add_argument('-o', '--output', help="write results as JSON (default: stdout)")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        if args.server:
+            results.extend(run_server_size(size, max(1, args.depth), max(1, args.fanout), max(1, args.clients),
+                                           args.requests, args.workers, args.seed))
+        else:
+            results.extend(run_size(size, max(1, args.depth), max(1, args.fanout), args.repeat,
+                                    args.queries, args.lookups, args.roots, args.seed))
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            logger.info("Compared with %s:\n%s", args.compare, compare(json.load(f), report))
+
+if __name__ == "__main__":
+    main()
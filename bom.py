@@ -0,0 +1,125 @@
+# bom.py
+
+import numpy as np
+
+
+class BillOfMaterials:
+    def __init__(self, items, catalog_version=None):
+        self.catalog_version = catalog_version
+        self.names = {}
+        self.types = {}
+        self.recipes = {}
+        self.ids_by_name = {}
+
+        for item in items:
+            ankama_id = item.ankama_id
+            self.names[ankama_id] = item.name
+            self.types[ankama_id] = item.type
+            self.ids_by_name.setdefault(item.name, []).append(ankama_id)
+            if item.recipe:
+                self.recipes[ankama_id] = list(zip(item.recipe.ids, item.recipe.quantities))
+
+        self._flat = {}
+        self._descendants = {}
+        self._build_matrix()
+
+    def is_craftable(self, ankama_id):
+        return ankama_id in self.recipes
+
+    def _explode(self, ankama_id, cut_ids, memo, visiting):
+        # Per-unit quantities of every node below ankama_id: leaves are raw resources and cut items
+        cached = memo.get(ankama_id)
+        if cached is not None:
+            return cached
+
+        leaves = {}
+        nodes = {}
+        visiting.add(ankama_id)
+        for ingredient_id, quantity in self.recipes.get(ankama_id, ()):
+            if ingredient_id not in self.names or ingredient_id in visiting:
+                continue
+            count, depth = nodes.get(ingredient_id, (0, 1))
+            nodes[ingredient_id] = (count + quantity, min(depth, 1))
+            if ingredient_id in self.recipes and ingredient_id not in cut_ids:
+                if cut_ids and not (cut_ids & self.descendants(ingredient_id)):
+                    sub_leaves, sub_nodes = self._explode(ingredient_id, frozenset(), self._flat, set())
+                else:
+                    sub_leaves, sub_nodes = self._explode(ingredient_id, cut_ids, memo, visiting)
+                for leaf_id, leaf_quantity in sub_leaves.items():
+                    leaves[leaf_id] = leaves.get(leaf_id, 0) + quantity * leaf_quantity
+                for node_id, (node_count, node_depth) in sub_nodes.items():
+                    count, depth = nodes.get(node_id, (0, node_depth + 1))
+                    nodes[node_id] = (count + quantity * node_count, min(depth, node_depth + 1))
+            else:
+                leaves[ingredient_id] = leaves.get(ingredient_id, 0) + quantity
+        visiting.discard(ankama_id)
+
+        memo[ankama_id] = (leaves, nodes)
+        return leaves, nodes
+
+    def explode(self, ankama_id, cut_ids=frozenset(), memo=None):
+        # Pass the same memo for every call that shares one set of cut items
+        if not cut_ids or not (cut_ids & self.descendants(ankama_id)):
+            return self._explode(ankama_id, frozenset(), self._flat, set())
+        return self._explode(ankama_id, cut_ids, memo if memo is not None else {}, set())
+
+    def descendants(self, ankama_id):
+        # Craftable items anywhere below ankama_id; a user cost on any of them changes its flattening
+        cached = self._descendants.get(ankama_id)
+        if cached is None:
+            _, nodes = self._explode(ankama_id, frozenset(), self._flat, set())
+            cached = frozenset(node_id for node_id in nodes if node_id in self.recipes)
+            self._descendants[ankama_id] = cached
+        return cached
+
+    def _build_matrix(self):
+        # Sparse rows (craftable item) x columns (raw resource) in coordinate form
+        self.row_index = {ankama_id: row for row, ankama_id in enumerate(self.recipes)}
+        self.column_ids = []
+        self.column_index = {}
+        entry_rows = []
+        entry_columns = []
+        entry_quantities = []
+        for ankama_id, row in self.row_index.items():
+            leaves, _ = self._explode(ankama_id, frozenset(), self._flat, set())
+            for leaf_id, quantity in leaves.items():
+                column = self.column_index.get(leaf_id)
+                if column is None:
+                    column = self.column_index[leaf_id] = len(self.column_ids)
+                    self.column_ids.append(leaf_id)
+                entry_rows.append(row)
+                entry_columns.append(column)
+                entry_quantities.append(quantity)
+        self.entry_rows = np.array(entry_rows, dtype=np.int64)
+        self.entry_columns = np.array(entry_columns, dtype=np.int64)
+        self.entry_quantities = np.array(entry_quantities, dtype=np.float64)
+
+    def price_vector(self, prices):
+        vector = np.zeros(len(self.column_ids), dtype=np.float64)
+        for ankama_id, price in prices.items():
+            column = self.column_index.get(ankama_id)
+            if column is not None:
+                vector[column] = price
+        return vector
+
+    def catalog_unit_costs(self, price_vector):
+        # One sparse matrix-vector product gives the uncut unit cost of every craftable item
+        return np.bincount(self.entry_rows, weights=self.entry_quantities * price_vector[self.entry_columns],
+                           minlength=len(self.row_index))
+
+    def unit_costs(self, ankama_ids, prices, cut_ids=frozenset()):
+        # prices maps ankama_id -> unit price for raw resources and for every cut item
+        all_costs = self.catalog_unit_costs(self.price_vector(prices))
+        memo = {}
+        costs = np.zeros(len(ankama_ids), dtype=np.float64)
+        for position, ankama_id in enumerate(ankama_ids):
+            if ankama_id in cut_ids:
+                costs[position] = prices.get(ankama_id, 0)
+            elif ankama_id not in self.recipes:
+                continue
+            elif cut_ids & self.descendants(ankama_id):
+                leaves, _ = self.explode(ankama_id, cut_ids, memo)
+                costs[position] = sum(quantity * prices.get(leaf_id, 0) for leaf_id, quantity in leaves.items())
+            else:
+                costs[position] = all_costs[self.row_index[ankama_id]]
+        return costs
@@ -0,0 +1,64 @@
+# calculation_worker.py
+
+import logging
+import threading
+
+from calculator import CalculationCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class CalculationJob:
+    def __init__(self, calculator, rows, full):
+        # calculator is a CraftCalculator.snapshot() the worker owns; rows holds (entry key, name, amount, sell_price)
+        self.calculator = calculator
+        self.rows = rows
+        self.full = full
+        self.cancelled = threading.Event()
+        self.costs = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.costs = self.calculator.calculate_rows([(name, amount) for _, name, amount, _ in self.rows], self.full, self.cancelled)
+        except CalculationCancelled:
+            pass
+        except Exception as e:
+            logger.error(f"Error during calculation: {e}")
+            self.error = e
+
+
+class CalculationWorker:
+    # One background recompute at a time. Submitting cancels the running job, and the newest
+    # submission replaces any still waiting, so a burst of edits costs at most one extra run.
+    def __init__(self):
+        self.thread = None
+        self.current = None
+        self.pending = None
+
+    def busy(self):
+        return self.current is not None or self.pending is not None
+
+    def submit(self, job):
+        if self.current is not None:
+            self.current.cancelled.set()
+        self.pending = job
+        self._start_next()
+
+    def _start_next(self):
+        if self.pending is not None and (self.thread is None or not self.thread.is_alive()):
+            self.current, self.pending = self.pending, None
+            self.thread = threading.Thread(target=self.current.run, daemon=True)
+            self.thread.start()
+
+    def poll(self):
+        # Called from the Tk thread; returns a finished job whose results are current, else None
+        if self.current is None or self.thread.is_alive():
+            self._start_next()
+            return None
+        job = self.current
+        self.current = None
+        self._start_next()
+        if job.cancelled.is_set() or job.error is not None:
+            return None
+        return job
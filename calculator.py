@@ -0,0 +1,286 @@
+import json
+import logging
+import os
+from typing import Dict, Any
+
+from models import Ingredient, IngredientManager
+from utils import process_recipe, StatsCache
+from data_access import data_access
+from profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+class CalculationCancelled(Exception):
+    pass
+
+class CraftCalculator:
+    def __init__(self):
+        self.ingredient_manager = IngredientManager()
+        self.intermediate_items: Dict[str, Dict[str, Any]] = {}
+        self.resource_usage: Dict[str, set] = {}
+        self.total_amounts: Dict[str, int] = {}
+        self.user_set_costs: Dict[str, float] = {}
+        self.original_intermediate_items: Dict[str, Dict[str, Any]] = {}
+        self.item_details_cache = StatsCache()
+
+        # Which intermediates use each ingredient, and the last per-unit cost of every craftable node
+        self.intermediate_usage: Dict[str, set] = {}
+        self.unit_costs: Dict[str, float] = {}
+
+        # 'bom' prices every row from precompiled bills of materials instead of walking recipes
+        self.use_bom = os.environ.get('CRAFTIMIZER_COST_ENGINE', 'recursive') == 'bom'
+        self.bom = None
+        if self.use_bom:
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                logger.warning("NumPy is not installed, using the recursive cost engine")
+                self.use_bom = False
+
+    def snapshot(self, keep_results=False):
+        # Independent copy of the pricing inputs for a background run; keep_results also copies
+        # what the last run accumulated. The BOM and item details cache are shared, not copied.
+        snapshot = CraftCalculator()
+        snapshot.use_bom = self.use_bom
+        snapshot.bom = self.bom
+        snapshot.item_details_cache = self.item_details_cache
+        snapshot.user_set_costs = dict(self.user_set_costs)
+        snapshot.intermediate_items = {name: dict(details) for name, details in self.intermediate_items.items()}
+        snapshot.original_intermediate_items = {name: dict(details) for name, details in self.original_intermediate_items.items()}
+        for ingredient in self.ingredient_manager.get_ingredients_list():
+            snapshot.ingredient_manager.ingredients[ingredient.name] = Ingredient(ingredient.name, ingredient.amount, ingredient.cost, ingredient.type)
+        if keep_results:
+            snapshot.total_amounts = dict(self.total_amounts)
+            snapshot.resource_usage = {name: set(users) for name, users in self.resource_usage.items()}
+            snapshot.intermediate_usage = {name: set(users) for name, users in self.intermediate_usage.items()}
+            snapshot.unit_costs = dict(self.unit_costs)
+        return snapshot
+
+    def adopt_results(self, snapshot):
+        # Takes over what a finished background run computed; user_set_costs stays the caller's own
+        self.ingredient_manager = snapshot.ingredient_manager
+        self.intermediate_items = snapshot.intermediate_items
+        self.original_intermediate_items = snapshot.original_intermediate_items
+        self.total_amounts = snapshot.total_amounts
+        self.resource_usage = snapshot.resource_usage
+        self.intermediate_usage = snapshot.intermediate_usage
+        self.unit_costs = snapshot.unit_costs
+        self.bom = snapshot.bom
+
+    def reset_calculation(self):
+        self.resource_usage.clear()
+        self.total_amounts.clear()
+        self.intermediate_usage.clear()
+        self.unit_costs.clear()
+
+    def get_clean_type(self, type_data: Any) -> str:
+        if isinstance(type_data, str):
+            return type_data
+        elif isinstance(type_data, dict):
+            return type_data.get('name', 'Unknown')
+        else:
+            try:
+                type_dict = json.loads(type_data.replace("'", '"'))
+                return type_dict.get('name', 'Unknown')
+            except json.JSONDecodeError:
+                return str(type_data)
+
+    def get_item_details(self, name_or_id: str) -> Dict[str, Any]:
+        # Cached per catalog version, so a data refresh drops every entry
+        return self.item_details_cache.get(name_or_id, data_access.catalog_version, self._load_item_details)
+
+    def _load_item_details(self, name_or_id: str) -> Dict[str, Any]:
+        try:
+            ankama_id = int(name_or_id)
+        except ValueError:
+            return data_access.find_item_by_name(name_or_id)
+        return data_access.find_item_by_id(ankama_id)
+
+    def calculate_item_cost(self, item_details: Dict[str, Any], amount: int, level: int, parent_item: str = None) -> float:
+        if profiler.enabled:
+            profiler.count('calculator.calculate_item_cost')
+            profiler.maximum('calculator.recursion_depth', level)
+        item_name = item_details['name']
+        if item_name in self.user_set_costs:
+            return self.user_set_costs[item_name] * amount
+
+        total_cost = 0
+        if 'recipe' in item_details and item_details['recipe']:
+            ingredients = process_recipe(item_details['recipe'], amount)
+            for ingredient in ingredients:
+                if isinstance(ingredient, dict) and 'ankama_id' in ingredient:
+                    ingredient_details = self.get_item_details(ingredient['ankama_id'])
+                    if ingredient_details:
+                        ingredient_name = ingredient_details['name']
+                        ingredient_amount = ingredient['amount']
+                        ingredient_type = self.get_clean_type(ingredient_details.get('type', 'Unknown'))
+
+                        self.total_amounts[ingredient_name] = self.total_amounts.get(ingredient_name, 0) + ingredient_amount
+                        if level > 1:
+                            self.intermediate_usage.setdefault(ingredient_name, set()).add(item_name)
+
+                        if ingredient_name in self.user_set_costs:
+                            total_cost += self.user_set_costs[ingredient_name] * ingredient_amount
+                        elif 'recipe' in ingredient_details and ingredient_details['recipe']:
+                            sub_cost = self.calculate_item_cost(ingredient_details, ingredient_amount, level + 1, parent_item or item_details['name'])
+                            total_cost += sub_cost
+                            if ingredient_name not in self.intermediate_items:
+                                self.intermediate_items[ingredient_name] = {
+                                    'amount': ingredient_amount,
+                                    'cost': sub_cost / ingredient_amount if ingredient_amount > 0 else 0,
+                                    'level': level + 1,
+                                    'type': ingredient_type
+                                }
+                                self.original_intermediate_items[ingredient_name] = self.intermediate_items[ingredient_name].copy()
+                        else:
+                            ingredient_cost = self.user_set_costs.get(ingredient_name, self.ingredient_manager.get_ingredient_cost(ingredient_name))
+                            total_cost += ingredient_amount * ingredient_cost
+                            self.ingredient_manager.add_or_update_ingredient(
+                                ingredient_name,
+                                ingredient_amount,
+                                ingredient_cost,
+                                ingredient_type=ingredient_type
+                            )
+                        
+                        if parent_item:
+                            self.resource_usage.setdefault(ingredient_name, set()).add(parent_item)
+
+        if amount > 0:
+            self.unit_costs[item_name] = total_cost / amount
+        return total_cost
+
+    def get_current_unit_cost(self, name, affected, memo):
+        if name in self.user_set_costs:
+            return self.user_set_costs[name]
+        if name in affected:
+            return self.recompute_unit_cost(name, affected, memo)
+        if name in self.unit_costs:
+            return self.unit_costs[name]
+        return self.ingredient_manager.get_ingredient_cost(name)
+
+    def recompute_unit_cost(self, name, affected, memo):
+        if name in memo:
+            return memo[name]
+        total_cost = 0
+        item_details = self.get_item_details(name)
+        for ingredient in process_recipe(item_details.get('recipe') or []):
+            ingredient_details = self.get_item_details(ingredient['ankama_id'])
+            if ingredient_details:
+                total_cost += ingredient['amount'] * self.get_current_unit_cost(ingredient_details['name'], affected, memo)
+        memo[name] = total_cost
+        self.unit_costs[name] = total_cost
+        return total_cost
+
+    def get_bill_of_materials(self):
+        # Flattened once per catalog version; rebuilt after a data refresh
+        if self.bom is None or self.bom.catalog_version != data_access.catalog_version:
+            from bom import BillOfMaterials
+            self.bom = BillOfMaterials(data_access.iter_items(), data_access.catalog_version)
+        return self.bom
+
+    def calculate_costs_bom(self, rows):
+        # rows holds (item_details, amount, parent_item); same bookkeeping as calculate_item_cost
+        bom = self.get_bill_of_materials()
+        cut_ids = frozenset(ankama_id for name in self.user_set_costs for ankama_id in bom.ids_by_name.get(name, ()))
+        memo = {}
+
+        exploded = []
+        prices = {}
+        for item_details, amount, parent_item in rows:
+            ankama_id = item_details['ankama_id']
+            if ankama_id in cut_ids:
+                exploded.append(None)
+                continue
+            leaves, nodes = bom.explode(ankama_id, cut_ids, memo)
+            exploded.append(nodes)
+            for leaf_id in leaves:
+                leaf_name = bom.names[leaf_id]
+                prices[leaf_id] = self.user_set_costs.get(leaf_name, self.ingredient_manager.get_ingredient_cost(leaf_name))
+        for ankama_id in cut_ids:
+            prices[ankama_id] = self.user_set_costs[bom.names[ankama_id]]
+
+        intermediate_ids = list(dict.fromkeys(
+            node_id for nodes in exploded if nodes for node_id in nodes
+            if bom.is_craftable(node_id) and node_id not in cut_ids
+        ))
+        root_ids = [item_details['ankama_id'] for item_details, _, _ in rows]
+        unit_costs = bom.unit_costs(root_ids + intermediate_ids, prices, cut_ids)
+        intermediate_costs = dict(zip(intermediate_ids, unit_costs[len(root_ids):]))
+
+        total_costs = []
+        for (item_details, amount, parent_item), nodes, unit_cost in zip(rows, exploded, unit_costs):
+            total_costs.append(float(unit_cost) * amount)
+            if nodes is None:
+                continue
+            for node_id, (count, depth) in nodes.items():
+                node_name = bom.names[node_id]
+                node_amount = count * amount
+                node_type = self.get_clean_type(bom.types[node_id])
+                self.total_amounts[node_name] = self.total_amounts.get(node_name, 0) + node_amount
+
+                if node_id in intermediate_costs:
+                    if node_name not in self.intermediate_items:
+                        self.intermediate_items[node_name] = {
+                            'amount': node_amount,
+                            'cost': float(intermediate_costs[node_id]),
+                            'level': depth + 1,
+                            'type': node_type
+                        }
+                        self.original_intermediate_items[node_name] = self.intermediate_items[node_name].copy()
+                elif node_id not in cut_ids:
+                    self.ingredient_manager.add_or_update_ingredient(
+                        node_name,
+                        node_amount,
+                        prices.get(node_id, 0),
+                        ingredient_type=node_type
+                    )
+
+                if parent_item:
+                    self.resource_usage.setdefault(node_name, set()).add(parent_item)
+
+        return total_costs
+
+    @profiler.timed('calculator.calculate_rows')
+    def calculate_rows(self, rows, full=True, cancelled=None):
+        # rows holds (name, amount) per equipment row; returns each row's cost per unit, None where nothing was priced.
+        # full starts from a clean slate; otherwise every row is priced for one unit on top of the current state.
+        # cancelled is a threading.Event checked between rows.
+        previous_intermediates = None
+        if full:
+            self.reset_calculation()
+            previous_intermediates = self.intermediate_items.copy()
+            self.intermediate_items.clear()
+            for ingredient in self.ingredient_manager.get_ingredients_list():
+                self.ingredient_manager.update_ingredient_amount(ingredient.name, 0)
+
+        priced = []
+        for position, (name, amount) in enumerate(rows):
+            item_details = self.get_item_details(name)
+            if item_details and (not full or item_details.get('recipe')):
+                priced.append((position, name if full else None, amount if full else 1, item_details))
+
+        def check_cancelled():
+            if cancelled is not None and cancelled.is_set():
+                raise CalculationCancelled()
+
+        if self.use_bom:
+            check_cancelled()
+            total_costs = self.calculate_costs_bom([(details, amount, parent) for _, parent, amount, details in priced])
+        else:
+            total_costs = []
+            for _, parent, amount, details in priced:
+                check_cancelled()
+                total_costs.append(self.calculate_item_cost(details, amount, 1, parent))
+        check_cancelled()
+
+        costs = [None] * len(rows)
+        for (position, _, amount, _), total_cost in zip(priced, total_costs):
+            costs[position] = total_cost / amount if amount else 0
+
+        if full:
+            for name, details in previous_intermediates.items():
+                if name in self.intermediate_items:
+                    self.intermediate_items[name]['level'] = details['level']
+                    if name in self.user_set_costs:
+                        self.intermediate_items[name]['cost'] = self.user_set_costs[name]
+        return costs
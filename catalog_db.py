@@ -0,0 +1,178 @@
+import json
+import os
+
+from models import ItemRecord, PackedRecipe
+from sqlite_store import SqliteStore, batches
+from utils import normalize_name
+
+DATABASE_FILE = 'catalog.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    ankama_id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    level INTEGER,
+    type TEXT
+);
+CREATE INDEX IF NOT EXISTS items_file_position ON items(file_name, position);
+CREATE INDEX IF NOT EXISTS items_name_key ON items(normalize_name(name));
+CREATE TABLE IF NOT EXISTS recipe_edges (
+    item_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    ingredient_id INTEGER,
+    quantity INTEGER NOT NULL,
+    item_subtype TEXT,
+    PRIMARY KEY (item_id, position)
+);
+CREATE INDEX IF NOT EXISTS recipe_edges_ingredient ON recipe_edges(ingredient_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS item_names USING fts5(
+    name, content='items', content_rowid='ankama_id', tokenize='trigram'
+);
+"""
+
+ITEM_COLUMNS = "i.ankama_id, i.name, i.level, i.type, e.ingredient_id, e.quantity, e.item_subtype"
+
+
+class SqliteCatalog(SqliteStore):
+    schema = SCHEMA
+
+    def __init__(self, data_dir):
+        super().__init__(os.path.join(data_dir, DATABASE_FILE))
+
+    def _prepare(self, connection):
+        # Backs the items_name_key expression index, so it must exist on every connection
+        connection.create_function('normalize_name', 1, normalize_name, deterministic=True)
+
+    def get_signature(self):
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'sources'").fetchone()
+        if row is None:
+            return None
+        return {file_name: tuple(value) if value is not None else None
+                for file_name, value in json.loads(row[0]).items()}
+
+    def populate(self, catalogs, signature):
+        # Replace the whole catalog in one transaction; WAL keeps readers on the old data until commit
+        connection = self._connect()
+        with connection:
+            connection.execute("DELETE FROM recipe_edges")
+            connection.execute("DELETE FROM items")
+            for file_name, catalog in catalogs.items():
+                connection.executemany(
+                    "INSERT OR IGNORE INTO items (ankama_id, file_name, position, name, level, type) VALUES (?, ?, ?, ?, ?, ?)",
+                    ((item.ankama_id, file_name, position, item.name,
+                      item.level if isinstance(item.level, int) else None, json.dumps(item.type))
+                     for position, item in enumerate(catalog['items']))
+                )
+                connection.executemany(
+                    "INSERT OR IGNORE INTO recipe_edges (item_id, position, ingredient_id, quantity, item_subtype) VALUES (?, ?, ?, ?, ?)",
+                    ((item.ankama_id, position, ingredient_id, quantity, item_subtype)
+                     for item in catalog['items']
+                     for position, (ingredient_id, quantity, item_subtype) in enumerate(item.recipe))
+                )
+            connection.execute("INSERT INTO item_names(item_names) VALUES ('rebuild')")
+            connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('sources', ?)",
+                               (json.dumps(signature),))
+
+    def _rows_to_items(self, rows):
+        # Rows arrive grouped by item; each group becomes one ItemRecord
+        items = []
+        current = None
+        ingredients = []
+
+        def finish():
+            if ingredients:
+                current.recipe = PackedRecipe(*zip(*ingredients))
+                ingredients.clear()
+
+        for ankama_id, name, level, type_data, ingredient_id, quantity, item_subtype in rows:
+            if current is None or current.ankama_id != ankama_id:
+                if current is not None:
+                    finish()
+                current = ItemRecord(ankama_id, name,
+                                     level if level is not None else 'N/A',
+                                     json.loads(type_data) if type_data is not None else 'N/A')
+                items.append(current)
+            if quantity is not None and ingredient_id is not None:
+                ingredients.append((ingredient_id, quantity, item_subtype))
+        if current is not None:
+            finish()
+        return items
+
+    def search(self, file_name, search_term):
+        connection = self._connect()
+        if len(search_term) >= 3:
+            # The trigram tokenizer answers substring queries from the index
+            phrase = '"' + search_term.replace('"', '""') + '"'
+            rows = connection.execute(
+                f"SELECT {ITEM_COLUMNS} FROM item_names f JOIN items i ON i.ankama_id = f.rowid "
+                "LEFT JOIN recipe_edges e ON e.item_id = i.ankama_id "
+                "WHERE item_names MATCH ? AND i.file_name = ? ORDER BY i.position, e.position",
+                (phrase, file_name)
+            )
+        else:
+            pattern = '%' + search_term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            rows = connection.execute(
+                f"SELECT {ITEM_COLUMNS} FROM items i LEFT JOIN recipe_edges e ON e.item_id = i.ankama_id "
+                "WHERE i.file_name = ? AND i.name LIKE ? ESCAPE '\\' ORDER BY i.position, e.position",
+                (file_name, pattern)
+            )
+        return self._rows_to_items(rows)
+
+    def iter_items(self):
+        rows = self._connect().execute(
+            f"SELECT {ITEM_COLUMNS} FROM items i LEFT JOIN recipe_edges e ON e.item_id = i.ankama_id "
+            "ORDER BY i.ankama_id, e.position"
+        )
+        return iter(self._rows_to_items(rows))
+
+    def get(self, ankama_id, file_name=None):
+        query = (f"SELECT {ITEM_COLUMNS} FROM items i LEFT JOIN recipe_edges e ON e.item_id = i.ankama_id "
+                 "WHERE i.ankama_id = ?")
+        params = [ankama_id]
+        if file_name is not None:
+            query += " AND i.file_name = ?"
+            params.append(file_name)
+        items = self._rows_to_items(self._connect().execute(query + " ORDER BY e.position", params))
+        return items[0] if items else None
+
+    def get_by_name_key(self, name_key):
+        # (file_name, item) for every item whose normalize_name() equals name_key
+        connection = self._connect()
+        file_names = dict(connection.execute(
+            "SELECT ankama_id, file_name FROM items WHERE normalize_name(name) = ?", (name_key,)
+        ))
+        if not file_names:
+            return []
+        placeholders = ', '.join('?' * len(file_names))
+        items = self._rows_to_items(connection.execute(
+            f"SELECT {ITEM_COLUMNS} FROM items i LEFT JOIN recipe_edges e ON e.item_id = i.ankama_id "
+            f"WHERE i.ankama_id IN ({placeholders}) ORDER BY i.ankama_id, e.position", list(file_names)
+        ))
+        return [(file_names[item.ankama_id], item) for item in items]
+
+    def get_by_name_keys(self, name_keys):
+        # get_by_name_key for many keys, one pair of queries per batch: name_key -> [(file_name, item)]
+        connection = self._connect()
+        matches = {}
+        for batch in batches(name_keys):
+            placeholders = ', '.join('?' * len(batch))
+            for ankama_id, file_name, name_key in connection.execute(
+                f"SELECT ankama_id, file_name, normalize_name(name) FROM items WHERE normalize_name(name) IN ({placeholders})", batch
+            ):
+                matches[ankama_id] = (file_name, name_key)
+        found = {}
+        for batch in batches(matches):
+            placeholders = ', '.join('?' * len(batch))
+            for item in self._rows_to_items(connection.execute(
+                f"SELECT {ITEM_COLUMNS} FROM items i LEFT JOIN recipe_edges e ON e.item_id = i.ankama_id "
+                f"WHERE i.ankama_id IN ({placeholders}) ORDER BY i.ankama_id, e.position", batch
+            )):
+                file_name, name_key = matches[item.ankama_id]
+                found.setdefault(name_key, []).append((file_name, item))
+        return found
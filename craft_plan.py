@@ -0,0 +1,267 @@
+# craft_plan.py
+
+import hashlib
+import json
+import logging
+import os
+
+from calculator import CraftCalculator
+from data_access import data_access
+from models import Ingredient
+
+logger = logging.getLogger(__name__)
+
+PLAN_FILE = 'plan.json'
+PLAN_VERSION = 1
+
+
+class PlanEntry:
+    __slots__ = ('name', 'amount', 'sell_price', 'cost_per_unit')
+
+    def __init__(self, name, amount=1, sell_price=0.0):
+        self.name = name
+        self.amount = amount
+        self.sell_price = sell_price
+        self.cost_per_unit = None  # None until a recompute prices the row
+
+    @property
+    def profit(self):
+        if self.cost_per_unit is None:
+            return 0
+        return (self.sell_price - self.cost_per_unit) * self.amount
+
+
+class CraftPlan(CraftCalculator):
+    # The equipment list as plain data: entries, their amounts and sell prices, the user's costs and
+    # the computed results. Nothing here touches Tk, so a plan can be built and priced headless.
+    def __init__(self):
+        super().__init__()
+        self.entries = {}  # key -> PlanEntry, in display order
+        self.next_key = 0
+
+        # Entry keys per equipment name from the last full recompute, used to reprice only what an edit touches
+        self.calculated_rows = {}
+        self.dependencies_valid = False
+
+        # Resource name -> (low, high) price for price_sensitivity(); other resources get a spread around their price
+        self.price_ranges = {}
+
+    def find_entry(self, name):
+        for key, entry in self.entries.items():
+            if entry.name == name:
+                return key
+        return None
+
+    def add_entry(self, name, amount=1, sell_price=0.0):
+        # Adding a name already in the plan raises its amount; returns (key, created)
+        key = self.find_entry(name)
+        if key is not None:
+            self.entries[key].amount += amount
+            return key, False
+        self.next_key += 1
+        key = f"entry{self.next_key}"
+        self.entries[key] = PlanEntry(name, amount, sell_price)
+        return key, True
+
+    def remove_entry(self, key):
+        self.entries.pop(key, None)
+
+    def set_amount(self, key, amount):
+        self.entries[key].amount = amount
+
+    def set_sell_price(self, key, sell_price):
+        self.entries[key].sell_price = sell_price
+
+    def rows(self):
+        return [(key, entry.name, entry.amount, entry.sell_price) for key, entry in self.entries.items()]
+
+    def recompute(self, full=True):
+        # Synchronous version of what the app runs on its worker thread; returns the keys whose results changed
+        rows = self.rows()
+        self.dependencies_valid = False
+        costs = self.calculate_rows([(name, amount) for _, name, amount, _ in rows], full)
+        return self.apply_costs(rows, costs, full)
+
+    def apply_costs(self, rows, costs, full):
+        # rows are the (key, name, amount, sell_price) the costs were computed for
+        if full:
+            self.calculated_rows.clear()
+        updated = []
+        for (key, name, _, _), cost_per_unit in zip(rows, costs):
+            # Entries removed since the rows were taken are skipped
+            if cost_per_unit is None or key not in self.entries:
+                continue
+            if full:
+                self.calculated_rows.setdefault(name, []).append(key)
+            self.entries[key].cost_per_unit = cost_per_unit
+            updated.append(key)
+
+        # The bill-of-materials engine does not record the reverse dependency graph
+        self.dependencies_valid = full and not self.use_bom
+        return updated
+
+    def is_intermediate(self, item_name):
+        if item_name in self.original_intermediate_items:
+            return True
+        item_details = self.get_item_details(item_name)
+        return bool(item_details and item_details.get('recipe'))
+
+    def is_price_only_change(self, ingredient_name, new_cost):
+        # Setting or clearing a cost on an intermediate changes which subtrees are walked
+        if not self.dependencies_valid:
+            return False
+        if self.is_intermediate(ingredient_name):
+            return ingredient_name in self.user_set_costs and new_cost != 0
+        return True
+
+    def reprice(self, ingredient_name):
+        # Walks up the reverse dependency graph and reprices only the intermediates and entries above the edit.
+        # Returns (intermediate names whose cost changed, entry keys whose cost changed).
+        affected = set()
+        stack = [ingredient_name]
+        while stack:
+            for parent in self.intermediate_usage.get(stack.pop(), ()):
+                if parent not in affected:
+                    affected.add(parent)
+                    stack.append(parent)
+
+        memo = {}
+        intermediates = []
+        for name in affected:
+            cost = self.recompute_unit_cost(name, affected, memo)
+            if name in self.intermediate_items and name not in self.user_set_costs:
+                self.intermediate_items[name]['cost'] = cost
+                intermediates.append(name)
+
+        keys = []
+        for name in self.resource_usage.get(ingredient_name, ()):
+            if name in self.user_set_costs:
+                continue
+            cost_per_unit = self.recompute_unit_cost(name, affected, memo)
+            for key in self.calculated_rows.get(name, ()):
+                if key in self.entries:
+                    self.entries[key].cost_per_unit = cost_per_unit
+                    keys.append(key)
+        return intermediates, keys
+
+    def ingredient_rows(self):
+        # (name, total amount, unit cost, type) for everything bought rather than crafted
+        rows = []
+        for ingredient_name, total_amount in self.total_amounts.items():
+            if ingredient_name in self.user_set_costs or ingredient_name not in self.intermediate_items:
+                ingredient = self.ingredient_manager.get_ingredient(ingredient_name)
+                cost = self.user_set_costs.get(ingredient_name, ingredient.cost if ingredient else 0)
+                ingredient_type = ingredient.type if ingredient else self.intermediate_items.get(ingredient_name, {}).get('type', 'Intermediate')
+
+                # Check if it's an intermediate item
+                if ingredient_name in self.original_intermediate_items:
+                    ingredient_type = 'Intermediate'
+
+                rows.append((ingredient_name, total_amount, cost, ingredient_type))
+        return rows
+
+    def intermediate_rows(self):
+        # (name, total amount, unit cost, level) for the crafted intermediates, shallowest first
+        rows = []
+        for name, details in sorted(self.intermediate_items.items(), key=lambda x: x[1]['level']):
+            if name not in self.user_set_costs:
+                rows.append((name, self.total_amounts.get(name, 0), details['cost'], details['level']))
+        return rows
+
+    def make_or_buy_roots(self):
+        # Equipment name -> total amount across entries
+        roots = {}
+        for entry in self.entries.values():
+            roots[entry.name] = roots.get(entry.name, 0) + entry.amount
+        return roots
+
+    def set_price_range(self, name, low, high):
+        self.price_ranges[name] = (low, high)
+
+    def clear_price_range(self, name):
+        self.price_ranges.pop(name, None)
+
+    def price_sensitivity(self, **options):
+        # Monte Carlo profit distribution per entry from the last computed prices; options go to PriceSensitivity.run.
+        # Needs NumPy, imported on first use like the bill-of-materials engine.
+        from sensitivity import PriceSensitivity
+        return PriceSensitivity(self).run(ranges=self.price_ranges, **options)
+
+    def state_key(self):
+        # Saved results stay valid while the catalog files, every user-set cost and the cost engine are unchanged
+        state = {
+            'catalog': data_access.catalog_signature(),
+            'costs': sorted(self.user_set_costs.items()),
+            'engine': 'bom' if self.use_bom else 'recursive'
+        }
+        return hashlib.blake2b(json.dumps(state, sort_keys=True).encode('utf-8'), digest_size=16).hexdigest()
+
+    def to_state(self, with_results=True):
+        state = {
+            'version': PLAN_VERSION,
+            'next_key': self.next_key,
+            'entries': [[key, entry.name, entry.amount, entry.sell_price, entry.cost_per_unit] for key, entry in self.entries.items()],
+            'user_set_costs': self.user_set_costs,
+            'price_ranges': self.price_ranges,
+            'state_key': None,
+            'results': None
+        }
+        if with_results:
+            state['state_key'] = self.state_key()
+            state['results'] = {
+                'ingredients': [[ingredient.name, ingredient.amount, ingredient.cost, ingredient.type]
+                                for ingredient in self.ingredient_manager.get_ingredients_list()],
+                'total_amounts': self.total_amounts,
+                'intermediate_items': self.intermediate_items,
+                'original_intermediate_items': self.original_intermediate_items,
+                'resource_usage': {name: sorted(users) for name, users in self.resource_usage.items()},
+                'intermediate_usage': {name: sorted(users) for name, users in self.intermediate_usage.items()},
+                'unit_costs': self.unit_costs,
+                'calculated_rows': self.calculated_rows,
+                'dependencies_valid': self.dependencies_valid
+            }
+        return state
+
+    def save(self, path, with_results=True):
+        # with_results=False leaves the next load to recompute, e.g. when a recompute was still running
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_state(with_results), f)
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        # Restores the entries and user costs; returns True when the saved results matched and were restored too,
+        # False when the plan needs a recompute
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (json.JSONDecodeError, OSError) as e:
+            logger.error(f"Error reading saved plan {path}: {e}")
+            return False
+        if state.get('version') != PLAN_VERSION:
+            return False
+
+        self.entries = {key: PlanEntry(name, amount, sell_price) for key, name, amount, sell_price, _ in state['entries']}
+        self.next_key = state['next_key']
+        self.user_set_costs.update(state['user_set_costs'])
+        self.price_ranges = {name: tuple(price_range) for name, price_range in state.get('price_ranges', {}).items()}
+
+        results = state['results']
+        if results is None or state['state_key'] != self.state_key():
+            return False
+        for key, _, _, _, cost_per_unit in state['entries']:
+            self.entries[key].cost_per_unit = cost_per_unit
+        self.ingredient_manager.clear_ingredients()
+        for name, amount, cost, ingredient_type in results['ingredients']:
+            self.ingredient_manager.ingredients[name] = Ingredient(name, amount, cost, ingredient_type)
+        self.total_amounts = results['total_amounts']
+        self.intermediate_items = results['intermediate_items']
+        self.original_intermediate_items = results['original_intermediate_items']
+        self.resource_usage = {name: set(users) for name, users in results['resource_usage'].items()}
+        self.intermediate_usage = {name: set(users) for name, users in results['intermediate_usage'].items()}
+        self.unit_costs = results['unit_costs']
+        self.calculated_rows = results['calculated_rows']
+        self.dependencies_valid = results['dependencies_valid']
+        return True
@@ -1,10 +1,66 @@
+import gzip
 import json
 import os
+import pickle
 import sys
+import threading
 from functools import lru_cache
 
+from catalog_db import SqliteCatalog
+from models import ItemRecord
+from profiling import profiler
+from utils import normalize_name
+
+CATALOG_FILES = ['dofus_resources.json', 'dofus_equipment.json', 'dofus_consumables.json']
+SNAPSHOT_FILE = 'catalog.snapshot'
+# Per catalog file: HTTP validators, when it was last checked, and the digest of the records it holds
+CATALOG_META_FILE = 'catalog_meta.json'
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FIELDS = ('ankama_id', 'name', 'level', 'type', 'recipe')
+# Which catalog wins when the same name appears in more than one file
+NAME_LOOKUP_ORDER = ['dofus_equipment.json', 'dofus_resources.json', 'dofus_consumables.json']
+# Set to write new catalog downloads as gzip-compressed record streams
+COMPRESS_RECORDS = os.environ.get('CRAFTIMIZER_COMPRESS_CATALOG', '') not in ('', '0')
+
+def project_item(item):
+    return {key: item[key] for key in SNAPSHOT_FIELDS if key in item}
+
+def record_file_names(file_name):
+    # Compact one-item-per-line record streams that replace the raw API document on disk
+    stem = os.path.splitext(file_name)[0]
+    return (stem + '.jsonl.gz', stem + '.jsonl')
+
+def catalog_path(data_dir, file_name):
+    # Whichever form of the catalog is on disk; the raw API document is only left over from older versions
+    for candidate in record_file_names(file_name) + (file_name,):
+        path = os.path.join(data_dir, candidate)
+        if os.path.exists(path):
+            return path
+    return os.path.join(data_dir, file_name)
+
+def iter_catalog_file(file_path):
+    # Yields projected items one at a time; raises FileNotFoundError / json.JSONDecodeError like json.load
+    if file_path.endswith('.jsonl') or file_path.endswith('.jsonl.gz'):
+        opener = gzip.open if file_path.endswith('.gz') else open
+        with opener(file_path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            items = json.load(file).get('items', [])
+        for item in items:
+            yield project_item(item)
+
+def load_catalog_meta(data_dir):
+    try:
+        with open(os.path.join(data_dir, CATALOG_META_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
 class DataAccess:
-    def __init__(self):
+    def __init__(self, backend=None):
         if getattr(sys, 'frozen', False):
             # We are running in a bundle (packaged executable)
             self.current_dir = sys._MEIPASS
@@ -15,46 +71,318 @@ class DataAccess:
         self.data_dir = os.path.join(self.current_dir, 'data')
         os.makedirs(self.data_dir, exist_ok=True)
 
-    @lru_cache(maxsize=3)
-    def _load_json_file(self, file_name):
-        file_path = os.path.join(self.data_dir, file_name)
+        # Files the user creates must outlive the bundle's temporary extraction directory
+        if getattr(sys, 'frozen', False):
+            self.user_data_dir = os.path.join(os.path.expanduser('~'), '.dofus_craftimizer')
+        else:
+            self.user_data_dir = self.data_dir
+        self._id_index = None
+        self._snapshot = None
+        self._name_indexes = {}
+        self._name_lookup = None
+        self.catalog_version = 0
+        # Lazy builds run under this lock, so a lookup racing the startup warm-up waits for it instead of repeating it
+        self._lock = threading.RLock()
+
+        # 'json' keeps the parsed catalog in memory, 'sqlite' queries an on-disk database
+        self.backend = backend or os.environ.get('CRAFTIMIZER_CATALOG_BACKEND', 'json')
+        self._database = SqliteCatalog(self.data_dir) if self.backend == 'sqlite' else None
+        self._database_checked = False
+
+    def iter_catalog(self, file_name):
+        file_path = catalog_path(self.data_dir, file_name)
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                return json.load(file)
+            yield from iter_catalog_file(file_path)
         except FileNotFoundError:
             print(f"File not found: {file_path}")
-            return {"items": []}
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, EOFError, OSError):
             print(f"Error decoding JSON from file: {file_path}")
-            return {"items": []}
 
-    def search_items(self, file_name, search_term, exact_ankama_id=None):
-        data = self._load_json_file(file_name)
-        results = []
-        for item in data['items']:
-            if exact_ankama_id is not None:
-                if item['ankama_id'] == exact_ankama_id:
-                    results.append(self._extract_item_data(item))
-                    break
-            elif search_term.lower() in item['name'].lower():
-                results.append(self._extract_item_data(item))
-        return results
-
-    def _extract_item_data(self, item):
+    def _build_records(self, file_name, shared):
+        return [ItemRecord.from_item(item, shared) for item in self.iter_catalog(file_name)]
+
+    @lru_cache(maxsize=3)
+    def _load_catalog_file(self, file_name):
+        with profiler.span('data_access.load_catalog'):
+            return {"items": self._build_records(file_name, {})}
+
+    def _source_signature(self):
+        # The digest of the records the importer wrote, as long as the file is still the one it wrote;
+        # files that got here another way fall back to their mtime and size
+        meta = load_catalog_meta(self.data_dir)
+        signature = {}
+        for file_name in CATALOG_FILES:
+            file_path = catalog_path(self.data_dir, file_name)
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                signature[file_name] = None
+                continue
+            entry = meta.get(file_name) or {}
+            written = (entry.get('file'), entry.get('size'), entry.get('mtime_ns'))
+            if entry.get('digest') and written == (os.path.basename(file_path), stat.st_size, stat.st_mtime_ns):
+                signature[file_name] = ('digest', entry['digest'])
+            else:
+                signature[file_name] = (stat.st_mtime_ns, stat.st_size)
+        return signature
+
+    def _load_snapshot(self):
+        # Loaded lazily on first access; False marks a missing or stale snapshot
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._read_snapshot()
+        return self._snapshot or None
+
+    def _read_snapshot(self):
+        snapshot_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        try:
+            with open(snapshot_path, 'rb') as file, profiler.span('data_access.load_snapshot'):
+                snapshot = pickle.load(file)
+        except FileNotFoundError:
+            return False
+        except (pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            print(f"Error reading catalog snapshot: {snapshot_path}")
+            return False
+        if snapshot.get('version') != SNAPSHOT_VERSION or snapshot.get('sources') != self._source_signature():
+            return False
+        return snapshot
+
+    def _load_catalog(self, file_name):
+        snapshot = self._load_snapshot()
+        if snapshot:
+            return snapshot['catalogs'][file_name]
+        with self._lock:
+            return self._load_catalog_file(file_name)
+
+    def _build_id_index(self, catalogs):
+        # The first file listed wins on duplicate ids
+        index = {}
+        for file_name in CATALOG_FILES:
+            for item in catalogs[file_name]['items']:
+                index.setdefault(item.ankama_id, item)
+        return index
+
+    def _get_id_index(self):
+        if self._id_index is None:
+            with self._lock:
+                if self._id_index is None:
+                    snapshot = self._load_snapshot()
+                    if snapshot:
+                        self._id_index = snapshot['id_index']
+                    else:
+                        self._id_index = self._build_id_index({file_name: self._load_catalog_file(file_name) for file_name in CATALOG_FILES})
+        return self._id_index
+
+    def reload(self):
+        with self._lock:
+            self._load_catalog_file.cache_clear()
+            self._id_index = None
+            self._snapshot = None
+            self._name_indexes = {}
+            self._name_lookup = None
+            self._database_checked = False
+            # Lets derived structures built from the catalog notice a refresh
+            self.catalog_version += 1
+
+    @profiler.timed('data_access.warm_up')
+    def warm_up(self):
+        # Builds what the first lookup and search would otherwise pay for; run from a background thread at startup
+        if self._database is not None:
+            self._get_database()
+            return
+        self._get_id_index()
+        self._get_name_lookup()
+        self._get_name_index('dofus_equipment.json')
+
+    def catalog_signature(self):
+        # Identifies the catalog files on disk; unlike catalog_version it stays the same across restarts
+        return self._source_signature()
+
+    def snapshot_is_current(self):
+        return self._load_snapshot() is not None
+
+    @profiler.timed('data_access.write_snapshot')
+    def write_snapshot(self):
+        # Pickled as ItemRecords, so loading the snapshot is the whole catalog load
+        shared = {}
+        catalogs = {file_name: {'items': self._build_records(file_name, shared)} for file_name in CATALOG_FILES}
+
+        snapshot = {
+            'version': SNAPSHOT_VERSION,
+            'sources': self._source_signature(),
+            'catalogs': catalogs,
+            'id_index': self._build_id_index(catalogs)
+        }
+        snapshot_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        temp_path = snapshot_path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, snapshot_path)
+
+        # The parsed JSON is no longer needed once the snapshot is in place
+        self.reload()
+
+    def database_is_current(self):
+        return self._database is not None and self._database.get_signature() == self._source_signature()
+
+    @profiler.timed('data_access.write_database')
+    def write_database(self):
+        catalogs = {file_name: self._load_catalog(file_name) for file_name in CATALOG_FILES}
+        self._database.populate(catalogs, self._source_signature())
+        # Nothing else needs the parsed catalog once the database holds it
+        self._load_catalog_file.cache_clear()
+        self._snapshot = None
+        self._database_checked = True
+
+    def _get_database(self):
+        if not self._database_checked:
+            with self._lock:
+                if not self._database_checked:
+                    if not self.database_is_current():
+                        self.write_database()
+                    self._database_checked = True
+        return self._database
+
+    def _get_name_index(self, file_name):
+        # Lower-cased names plus trigram -> positions postings, built once per catalog load
+        index = self._name_indexes.get(file_name)
+        if index is None:
+            with self._lock:
+                index = self._name_indexes.get(file_name)
+                if index is None:
+                    names = [item.name.lower() for item in self._load_catalog(file_name)['items']]
+                    trigrams = {}
+                    for position, name in enumerate(names):
+                        for start in range(len(name) - 2):
+                            trigrams.setdefault(name[start:start + 3], set()).add(position)
+                    index = (names, trigrams)
+                    self._name_indexes[file_name] = index
+        return index
+
+    def _get_name_lookup(self):
+        # normalize_name(name) -> record, plus every record for the rare keys several different names fold to
+        if self._name_lookup is None:
+            with self._lock:
+                if self._name_lookup is None:
+                    lookup = {}
+                    collisions = {}
+                    for file_name in NAME_LOOKUP_ORDER:
+                        for item in self._load_catalog(file_name)['items']:
+                            key = normalize_name(item.name)
+                            first = lookup.setdefault(key, item)
+                            if first is not item and first.name != item.name:
+                                collisions.setdefault(key, [first]).append(item)
+                    self._name_lookup = (lookup, collisions)
+        return self._name_lookup
+
+    @profiler.timed('data_access.find_item_by_name')
+    def find_item_by_name(self, name):
+        # Exact match after case and accent folding; a record whose name matches exactly wins a fold collision
+        key = normalize_name(name)
+        if self._database is not None:
+            items = self._order_matches(self._get_database().get_by_name_key(key))
+        else:
+            lookup, collisions = self._get_name_lookup()
+            items = collisions.get(key) or ([lookup[key]] if key in lookup else [])
+        return self._pick_match(name, items)
+
+    @profiler.timed('data_access.find_items_by_names')
+    def find_items_by_names(self, names):
+        # find_item_by_name for many names, with one database round trip for the lot instead of one per name
+        keys = {name: normalize_name(name) for name in names}
+        if self._database is not None:
+            found = self._get_database().get_by_name_keys(set(keys.values()))
+            return {name: self._pick_match(name, self._order_matches(found.get(key, ()))) for name, key in keys.items()}
+        lookup, collisions = self._get_name_lookup()
         return {
-            'ankama_id': item['ankama_id'],
-            'name': item['name'],
-            'level': item.get('level', 'N/A'),
-            'type': item.get('type', 'N/A'),
-            'recipe': item.get('recipe', [])
+            name: self._pick_match(name, collisions.get(key) or ([lookup[key]] if key in lookup else []))
+            for name, key in keys.items()
         }
 
+    def _order_matches(self, matches):
+        return [item for _, item in sorted(matches, key=lambda match: NAME_LOOKUP_ORDER.index(match[0]))]
+
+    def _pick_match(self, name, items):
+        for item in items:
+            if item.name == name:
+                return item
+        return items[0] if items else None
+
+    def _candidate_positions(self, file_name, term):
+        names, trigrams = self._get_name_index(file_name)
+        if len(term) < 3:
+            return range(len(names))
+        postings = sorted((trigrams.get(term[start:start + 3], set()) for start in range(len(term) - 2)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return sorted(candidates)
+
+    def _match_rank(self, name, term):
+        # Exact match first, then prefix match, then any other substring match
+        if name == term:
+            return 0
+        if name.startswith(term):
+            return 1
+        return 2
+
+    def narrow_results(self, entries, search_term):
+        # Refine earlier search_entries() when the user types more characters onto the same query;
+        # sorting on (rank, position) gives the same order as a fresh search
+        term = search_term.lower()
+        matches = []
+        for position, item in entries:
+            name = item.name.lower()
+            if term in name:
+                matches.append((self._match_rank(name, term), position, item))
+        matches.sort(key=lambda match: match[:2])
+        return [(position, item) for _, position, item in matches]
+
+    @profiler.timed('data_access.search_entries')
+    def search_entries(self, file_name, search_term):
+        # (catalog position, item) pairs, exact matches first, then prefixes, then other substrings, each in catalog order
+        if self._database is not None:
+            # The database answers in catalog order, so the index in its results orders them the same way
+            results = self._get_database().search(file_name, search_term)
+            return self.narrow_results(enumerate(results), search_term)
+
+        items = self._load_catalog(file_name)['items']
+        term = search_term.lower()
+        names, _ = self._get_name_index(file_name)
+        matches = []
+        for position in self._candidate_positions(file_name, term):
+            name = names[position]
+            if term in name:
+                matches.append((self._match_rank(name, term), position))
+        matches.sort()
+        return [(position, items[position]) for _, position in matches]
+
+    def search_items(self, file_name, search_term, exact_ankama_id=None):
+        if exact_ankama_id is None:
+            return [item for _, item in self.search_entries(file_name, search_term)]
+        if self._database is not None:
+            item = self._get_database().get(exact_ankama_id, file_name)
+            return [item] if item else []
+        for item in self._load_catalog(file_name)['items']:
+            if item.ankama_id == exact_ankama_id:
+                return [item]
+        return []
+
     def find_item_by_id(self, ankama_id):
-        for file_name in ['dofus_resources.json', 'dofus_equipment.json', 'dofus_consumables.json']:
-            result = self.search_items(file_name, '', exact_ankama_id=ankama_id)
-            if result:
-                return result[0]
-        return None
+        # Every lookup returns the shared ItemRecord built at load time, never a copy
+        if profiler.enabled:
+            profiler.count('data_access.find_item_by_id')
+        if self._database is not None:
+            return self._get_database().get(ankama_id)
+        return self._get_id_index().get(ankama_id)
+
+    def iter_items(self):
+        if self._database is not None:
+            return self._get_database().iter_items()
+        return iter(self._get_id_index().values())
 
     def find_resource_by_id(self, ankama_id):
         item = self.find_item_by_id(ankama_id)
@@ -1,23 +1,33 @@
+import time
+STARTUP_STARTED = time.perf_counter()  # Taken before the other imports so the first startup phase covers them
+
 import os
 import sys
 from contextlib import contextmanager
 import logging
-import json
-from functools import lru_cache
+import sqlite3
 import tkinter as tk
 from tkinter import ttk, messagebox
-from typing import Dict, Any
 import threading
 
-from models import IngredientManager
-from utils import process_recipe
+from calculation_worker import CalculationJob, CalculationWorker
+from craft_plan import CraftPlan, PLAN_FILE
 from data_access import data_access
+from optimizer import MakeOrBuyOptimizer
+from price_book import PriceBook
+from price_import import read_prices
+from profiling import profiler
 from ui import StyledDofusCraftimizerUI
 from api_importer import update_dofus_data, check_files_exist, get_data_dir
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+SEARCH_DEBOUNCE_MS = 150
+CALCULATION_POLL_MS = 20
+WARM_UP_POLL_MS = 100
+IMPORT_PROBLEMS_SHOWN = 15  # Skipped rows listed after a price import; the rest are counted
+
 @contextmanager
 def loading_screen(master):
     screen = LoadingScreen(master)
@@ -59,9 +69,14 @@ class LoadingScreen:
             self.is_destroyed = True
             self.frame.destroy()
     
-class DofusCraftimizer:
+class DofusCraftimizer(CraftPlan):
     def __init__(self, master: tk.Tk):
         logger.info("Initializing DofusCraftimizer")
+        # Seconds per startup phase: imports, main_ui (window shown), warm_up (catalog ready, on a background thread)
+        self.startup_phases = {}
+        self.record_startup_phase('imports', STARTUP_STARTED)
+        self.init_started = time.perf_counter()
+        super().__init__()
         self.master = master
         self.master.title("Dofus Craftimizer")
         
@@ -71,13 +86,20 @@ class DofusCraftimizer:
         # Allow the window to be resized
         self.master.resizable(True, True)
 
-        self.ingredient_manager = IngredientManager()
-        self.equipment_data: Dict[str, Dict[str, float]] = {}
-        self.intermediate_items: Dict[str, Dict[str, Any]] = {}
-        self.resource_usage: Dict[str, set] = {}
-        self.total_amounts: Dict[str, int] = {}
-        self.user_set_costs: Dict[str, float] = {}
-        self.original_intermediate_items: Dict[str, Dict[str, Any]] = {}
+        self.calculation_worker = CalculationWorker()
+        self.calculation_after_id = None
+
+        self.price_book = PriceBook(data_access.user_data_dir)
+        self.make_or_buy_optimizer = None
+
+        self.search_after_id = None
+        self.last_search_query = ''
+        self.last_search_results = []
+
+        self.warm_up_thread = None
+        self.saved_prices = {}
+        self.plan_path = os.path.join(data_access.user_data_dir, PLAN_FILE)
+        self.plan_loaded = False
 
         self.loading_screen = None
         self.center_window(self.master)
@@ -148,6 +170,9 @@ class DofusCraftimizer:
         try:
             self.ui = StyledDofusCraftimizerUI(self.master, self)
             logger.info("Main UI created and displayed")
+            # Hidden shortcut for bug reports: starts profiling, then saves what it recorded
+            self.master.bind('<Control-Shift-P>', self.toggle_profiling)
+            self.load_plan()
             
             # Adjust window size after main UI is loaded
             self.master.update_idletasks()
@@ -155,18 +180,112 @@ class DofusCraftimizer:
             height = max(600, self.master.winfo_reqheight())
             self.master.geometry(f"{width}x{height}")
             self.center_window(self.master)
+            self.record_startup_phase('main_ui', self.init_started)
+            self.start_warm_up()
         except Exception as e:
             logger.error(f"Error loading main UI: {e}")
             self.show_error_message(f"Failed to load main UI: {e}")
+
+    def load_plan(self):
+        # Saved results are shown as they were when the catalog and prices still match; otherwise the plan is recomputed
+        restored = self.load(self.plan_path)
+        self.plan_loaded = True
+        for key in self.entries:
+            self.ui.insert_equipment(key)
+            self.render_entry(key)
+        if restored:
+            logger.info(f"Restored {len(self.entries)} plan rows with their saved results")
+            self.update_ingredients_list()
+            self.update_intermediate_items_list()
+        elif self.entries:
+            logger.info(f"Restored {len(self.entries)} plan rows, recomputing")
+            self.calculate()
+
+    def save_plan(self):
+        # Results a recompute was still replacing are not saved, so the next launch recomputes instead
+        if not self.plan_loaded:
+            return
+        try:
+            self.save(self.plan_path, with_results=not self.calculation_worker.busy())
+        except OSError as e:
+            logger.error(f"Error saving plan: {e}")
+
+    def record_startup_phase(self, name, started):
+        seconds = time.perf_counter() - started
+        self.startup_phases[name] = seconds
+        if profiler.enabled:
+            profiler.add_span(f'startup.{name}', seconds)
+
+    def start_warm_up(self):
+        # The catalog, its indexes and the saved prices load after the window is up instead of on the first action
+        self.warm_up_started = time.perf_counter()
+        self.warm_up_thread = threading.Thread(target=self.warm_up, daemon=True)
+        self.warm_up_thread.start()
+        self.master.after(WARM_UP_POLL_MS, self.check_warm_up_complete)
+
+    def warm_up(self):
+        # Runs on the warm-up thread, so it must not touch Tk or the plan
+        try:
+            data_access.warm_up()
+            self.saved_prices = self.read_saved_prices()
+        except Exception as e:
+            logger.error(f"Error warming up the catalog: {e}")
+
+    def check_warm_up_complete(self):
+        if self.warm_up_thread.is_alive():
+            self.master.after(WARM_UP_POLL_MS, self.check_warm_up_complete)
+            return
+        self.record_startup_phase('warm_up', self.warm_up_started)
+        logger.info("Startup: " + ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.startup_phases.items()))
+        self.apply_saved_prices(self.saved_prices)
     
+    def toggle_profiling(self, event=None):
+        if not profiler.enabled:
+            profiler.enable(use_cprofile=True)
+            logger.info("Profiling enabled")
+            messagebox.showinfo("Profiling", "Profiling started. Press Ctrl+Shift+P again to save the profile.")
+            return
+        paths = self.save_profile()
+        if paths:
+            messagebox.showinfo("Profiling", "Profile saved to:\n" + "\n".join(paths))
+
+    def save_profile(self):
+        profiler.set_value('calculator.item_details_cache', self.item_details_cache.stats())
+        logger.info(profiler.format_summary())
+        try:
+            paths = profiler.dump(data_access.user_data_dir)
+        except OSError as e:
+            logger.error(f"Error saving profile: {e}")
+            return None
+        logger.info(f"Profile saved to {', '.join(paths)}")
+        return paths
+
+    def schedule_search(self, *args):
+        if not self.ui.is_live_search_enabled():
+            return
+        # Debounce keystrokes so only the last one in a burst runs a search
+        if self.search_after_id is not None:
+            self.master.after_cancel(self.search_after_id)
+        self.search_after_id = self.master.after(SEARCH_DEBOUNCE_MS, self.search_equipment)
+
+    @profiler.timed('main.search')
     def search_equipment(self, event=None):
+        if self.search_after_id is not None:
+            self.master.after_cancel(self.search_after_id)
+            self.search_after_id = None
+
         query = self.ui.get_search_query()
-        results = data_access.search_items('dofus_equipment.json', query)
+        if event is None and not query:
+            # Live search on an emptied box clears the list instead of listing the whole catalog
+            results = []
+        elif self.last_search_query and query.lower().startswith(self.last_search_query.lower()):
+            results = data_access.narrow_results(self.last_search_results, query)
+        else:
+            results = data_access.search_entries('dofus_equipment.json', query)
+        self.last_search_query = query
+        self.last_search_results = results
 
-        self.ui.clear_results()
-        for item in results:
-            clean_type = self.get_clean_type(item['type'])
-            self.ui.insert_result((item['name'], item['level'], clean_type), item['ankama_id'])
+        self.ui.populate_results([item for _, item in results], self.get_clean_type)
 
     def add_to_equipment_list(self, event=None):
         if event:  # If triggered by double-click
@@ -177,25 +296,13 @@ class DofusCraftimizer:
         for selected_item in selected_items:
             values = self.ui.get_result_values(selected_item)
             item_name = values[0]  # Assuming the first value is the item name
-            
-            # Check if the item already exists in the equipment list
-            existing_item = None
-            for item in self.ui.get_equipment_children():
-                if self.ui.get_equipment_value(item, "Name") == item_name:
-                    existing_item = item
-                    break
-            
-            if existing_item:
-                # If the item exists, increase its amount by 1
-                current_amount = int(self.ui.get_equipment_value(existing_item, "Amount"))
-                new_amount = current_amount + 1
-                self.ui.set_equipment_value(existing_item, "Amount", str(new_amount))
-                self.equipment_data[existing_item]["amount"] = new_amount
-            else:
-                # If the item doesn't exist, add it to the list
-                item_id = self.ui.insert_equipment(item_name, (item_name, "1", "0", "0", "0"))
-                self.equipment_data[item_id] = {"sell_price": 0, "amount": 1}
-        
+
+            # An item already in the list gets its amount raised by 1
+            key, created = self.add_entry(item_name)
+            if created:
+                self.ui.insert_equipment(key)
+            self.render_entry(key)
+
         self.update_single_item()
         self.update_ingredients_list()
         self.ui.deselect_all_trees()  # Deselect all after adding
@@ -204,7 +311,7 @@ class DofusCraftimizer:
         selected_items = self.ui.equipment_tree.selection()
         for item in selected_items:
             self.ui.equipment_tree.delete(item)
-            self.equipment_data.pop(item, None)
+            self.remove_entry(item)
         self.calculate()
         self.update_ingredients_list()
         self.update_intermediate_items_list()
@@ -214,18 +321,25 @@ class DofusCraftimizer:
         tree_id = str(tree)
         if tree_id == str(self.ui.equipment_tree):
             if column == "#2":  # Amount
-                self.equipment_data[item] = self.equipment_data.get(item, {})
-                self.equipment_data[item]["amount"] = self.parse_number(new_value)
+                self.set_amount(item, self.parse_number(new_value))
             elif column == "#4":  # Sell Price
-                self.equipment_data[item] = self.equipment_data.get(item, {})
-                self.equipment_data[item]["sell_price"] = float(self.parse_number(new_value))
+                self.set_sell_price(item, float(self.parse_number(new_value)))
+            self.render_entry(item)
             self.update_single_item()
         elif tree_id == str(self.ui.ingredients_tree):
             ingredient_name = self.ui.get_tree_item_values(tree, item)[0]
             new_cost = float(self.parse_number(new_value))
+            if self.is_price_only_change(ingredient_name, new_cost):
+                self.user_set_costs[ingredient_name] = new_cost
+                self.save_user_cost(ingredient_name)
+                self.ui.set_tree_item_value(tree, item, "Cost", self.format_number(int(new_cost)))
+                self.apply_price_change(ingredient_name)
+                self.ui.deselect_all_trees()
+                return
             self.user_set_costs[ingredient_name] = new_cost
-            if new_cost == 0 and ingredient_name in self.original_intermediate_items:
+            if new_cost == 0 and self.is_intermediate(ingredient_name):
                 self.move_item_to_intermediate(ingredient_name)
+            self.save_user_cost(ingredient_name)
         elif tree_id == str(self.ui.intermediate_tree):
             item_name = self.ui.get_tree_item_values(tree, item)[0]
             new_cost = float(self.parse_number(new_value))
@@ -234,34 +348,11 @@ class DofusCraftimizer:
                 self.intermediate_items[item_name]['cost'] = new_cost
             if new_cost > 0:
                 self.move_item_to_ingredients(item_name)
+            self.save_user_cost(item_name)
 
         self.calculate()
         self.ui.deselect_all_trees()  # Deselect all after updating
 
-    def get_clean_type(self, type_data: Any) -> str:
-        if isinstance(type_data, str):
-            return type_data
-        elif isinstance(type_data, dict):
-            return type_data.get('name', 'Unknown')
-        else:
-            try:
-                type_dict = json.loads(type_data.replace("'", '"'))
-                return type_dict.get('name', 'Unknown')
-            except json.JSONDecodeError:
-                return str(type_data)
-
-    @lru_cache(maxsize=100)
-    def get_item_details(self, name_or_id: str) -> Dict[str, Any]:
-        try:
-            ankama_id = int(name_or_id)
-            return data_access.find_item_by_id(ankama_id)
-        except ValueError:
-            for item_type in ['dofus_equipment.json', 'dofus_resources.json', 'dofus_consumables.json']:
-                item_details = data_access.search_items(item_type, name_or_id)
-                if item_details:
-                    return item_details[0]
-        return None
-
     def move_item_to_ingredients(self, item_name):
         if item_name in self.intermediate_items:
             item_details = self.intermediate_items.pop(item_name)
@@ -283,133 +374,219 @@ class DofusCraftimizer:
             self.user_set_costs.pop(item_name, None)
             self.update_ingredients_list()
             self.update_intermediate_items_list()
+        elif item_name in self.user_set_costs:
+            # Priced in an earlier session, so this session never walked its recipe
+            self.ingredient_manager.remove_ingredient(item_name)
+            self.user_set_costs.pop(item_name)
+
+    def read_saved_prices(self):
+        # One batched read of the price book instead of one edit and recompute per price; returns name -> price
+        try:
+            saved_prices = self.price_book.latest_prices()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading saved prices: {e}")
+            return {}
+        prices = {}
+        for ankama_id, price in saved_prices.items():
+            name = data_access.find_resource_by_id(ankama_id)
+            if name is not None:
+                prices[name] = price
+        return prices
+
+    def apply_saved_prices(self, prices):
+        # Costs the user entered while the warm-up ran, or restored with the plan, take precedence
+        added = [name for name in prices if name not in self.user_set_costs]
+        for name in added:
+            self.user_set_costs[name] = prices[name]
+        logger.info(f"Loaded {len(prices)} saved prices")
+        if added and self.entries:
+            self.calculate()
+
+    def save_user_cost(self, item_name):
+        item_details = self.get_item_details(item_name)
+        if not item_details:
+            return
+        try:
+            if item_name in self.user_set_costs:
+                self.price_book.upsert_many([(item_details['ankama_id'], self.user_set_costs[item_name])])
+            else:
+                self.price_book.remove_many([item_details['ankama_id']])
+        except sqlite3.Error as e:
+            logger.error(f"Error saving price for {item_name}: {e}")
+
+    def apply_prices(self, prices, ankama_ids):
+        # Bulk path: prices is name -> price and ankama_ids name -> ankama_id. One transaction in the price book,
+        # then a single recompute. As when editing a cell, a zero on an intermediate means craft it again.
+        cleared = [name for name, price in prices.items() if price == 0 and self.is_intermediate(name)]
+        for name in cleared:
+            self.user_set_costs.pop(name, None)
+        bought = {name: price for name, price in prices.items() if name not in cleared}
+        self.user_set_costs.update(bought)
+        try:
+            self.price_book.upsert_many((ankama_ids[name], price) for name, price in bought.items())
+            if cleared:
+                self.price_book.remove_many(ankama_ids[name] for name in cleared)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving prices: {e}")
+        if self.entries:
+            self.calculate()
+        return len(prices)
+
+    @profiler.timed('main.import_prices')
+    def import_prices(self, event=None):
+        path = self.ui.ask_price_file()
+        if not path:
+            return
+        try:
+            imported = read_prices(path)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("Import Prices", f"Could not read {os.path.basename(path)}:\n{e}")
+            return
+        self.apply_prices(imported.prices, imported.ankama_ids)
+        logger.info(f"Imported {len(imported.prices)} prices from {imported.rows} rows, "
+                    f"{len(imported.unknown)} unknown items, {len(imported.invalid)} unreadable rows")
+
+        message = f"Imported {len(imported.prices)} prices from {imported.rows} rows."
+        problems = sorted([(line, f"unknown item {key}") for line, key in imported.unknown] + imported.invalid)
+        if problems:
+            message += f"\n\nSkipped {len(problems)} rows:\n"
+            message += "\n".join(f"line {line}: {problem}" for line, problem in problems[:IMPORT_PROBLEMS_SHOWN])
+            if len(problems) > IMPORT_PROBLEMS_SHOWN:
+                message += f"\n... and {len(problems) - IMPORT_PROBLEMS_SHOWN} more"
+            messagebox.showwarning("Import Prices", message)
+        else:
+            messagebox.showinfo("Import Prices", message)
+
+    def apply_price_change(self, ingredient_name):
+        intermediates, keys = self.reprice(ingredient_name)
+        for name in intermediates:
+            self.ui.set_intermediate_value(name, "Cost", self.format_number(int(self.intermediate_items[name]['cost'])))
+        for key in keys:
+            self.render_entry(key)
+
+    def get_make_or_buy_optimizer(self):
+        # Recipe lookups are cached per catalog version
+        if self.make_or_buy_optimizer is None or self.make_or_buy_optimizer[0] != data_access.catalog_version:
+            self.make_or_buy_optimizer = (data_access.catalog_version, MakeOrBuyOptimizer(self))
+        return self.make_or_buy_optimizer[1]
+
+    def optimize_make_or_buy(self, event=None):
+        roots = self.make_or_buy_roots()
+        optimizer = self.get_make_or_buy_optimizer()
+        intermediates, raws = optimizer.reachable(roots)
+
+        # Market prices: what the user pays now, else the last price they ever entered
+        market_prices = {name: self.user_set_costs[name] for name in intermediates if name in self.user_set_costs}
+        lookup_ids = {}
+        for name in intermediates - market_prices.keys():
+            item_details = self.get_item_details(name)
+            if item_details:
+                lookup_ids[item_details['ankama_id']] = name
+        try:
+            for ankama_id, price in self.price_book.last_known_prices(lookup_ids).items():
+                market_prices[lookup_ids[ankama_id]] = price
+        except sqlite3.Error as e:
+            logger.error(f"Error reading price history: {e}")
+
+        raw_prices = {name: self.user_set_costs.get(name, self.ingredient_manager.get_ingredient_cost(name)) for name in raws}
+        bought = {name for name in intermediates if name in self.user_set_costs}
+        plan = optimizer.solve(roots, market_prices, raw_prices, bought)
+        self.ui.show_make_or_buy_plan(plan, self.format_number)
+
+    def apply_make_or_buy_plan(self, plan):
+        to_buy = []
+        to_craft = []
+        for name, decision in plan['decisions'].items():
+            if decision['market_price'] is None:
+                continue
+            item_details = self.get_item_details(name)
+            if decision['action'] == 'buy':
+                self.user_set_costs[name] = decision['market_price']
+                if item_details:
+                    to_buy.append((item_details['ankama_id'], decision['market_price']))
+            elif name in self.user_set_costs:
+                self.user_set_costs.pop(name)
+                self.ingredient_manager.remove_ingredient(name)
+                if item_details:
+                    to_craft.append(item_details['ankama_id'])
+        try:
+            self.price_book.upsert_many(to_buy)
+            self.price_book.remove_many(to_craft)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving prices: {e}")
+        self.calculate()
 
-    def calculate_item_cost(self, item_details: Dict[str, Any], amount: int, level: int, parent_item: str = None) -> float:
-        item_name = item_details['name']
-        if item_name in self.user_set_costs:
-            return self.user_set_costs[item_name] * amount
-
-        total_cost = 0
-        if 'recipe' in item_details and item_details['recipe']:
-            ingredients = process_recipe(item_details['recipe'], amount)
-            for ingredient in ingredients:
-                if isinstance(ingredient, dict) and 'ankama_id' in ingredient:
-                    ingredient_details = self.get_item_details(ingredient['ankama_id'])
-                    if ingredient_details:
-                        ingredient_name = ingredient_details['name']
-                        ingredient_amount = ingredient['amount']
-                        ingredient_type = self.get_clean_type(ingredient_details.get('type', 'Unknown'))
-
-                        self.total_amounts[ingredient_name] = self.total_amounts.get(ingredient_name, 0) + ingredient_amount
-
-                        if ingredient_name in self.user_set_costs:
-                            total_cost += self.user_set_costs[ingredient_name] * ingredient_amount
-                        elif 'recipe' in ingredient_details and ingredient_details['recipe']:
-                            sub_cost = self.calculate_item_cost(ingredient_details, ingredient_amount, level + 1, parent_item or item_details['name'])
-                            total_cost += sub_cost
-                            if ingredient_name not in self.intermediate_items:
-                                self.intermediate_items[ingredient_name] = {
-                                    'amount': ingredient_amount,
-                                    'cost': sub_cost / ingredient_amount if ingredient_amount > 0 else 0,
-                                    'level': level + 1,
-                                    'type': ingredient_type
-                                }
-                                self.original_intermediate_items[ingredient_name] = self.intermediate_items[ingredient_name].copy()
-                        else:
-                            ingredient_cost = self.user_set_costs.get(ingredient_name, self.ingredient_manager.get_ingredient_cost(ingredient_name))
-                            total_cost += ingredient_amount * ingredient_cost
-                            self.ingredient_manager.add_or_update_ingredient(
-                                ingredient_name,
-                                ingredient_amount,
-                                ingredient_cost,
-                                ingredient_type=ingredient_type
-                            )
-                        
-                        if parent_item:
-                            self.resource_usage.setdefault(ingredient_name, set()).add(parent_item)
-
-        return total_cost
+    def show_price_risk(self, event=None):
+        try:
+            import numpy  # noqa: F401
+        except ImportError:
+            messagebox.showerror("Price Risk", "The price risk analysis needs NumPy to be installed.")
+            return
+        self.ui.show_price_risk(self.price_risk_rows, self.format_number)
+
+    @profiler.timed('main.price_risk')
+    def price_risk_rows(self, spread):
+        # Samples around the prices of the last finished recompute
+        rows = []
+        for key, result in self.price_sensitivity(spread=spread).items():
+            entry = self.entries[key]
+            rows.append((entry.name, entry.amount, result['p10'], result['p50'], result['p90'], result['loss_probability']))
+        return rows
 
     def calculate(self):
-        self.resource_usage.clear()
-        self.total_amounts.clear()
-        temp_intermediate_items = self.intermediate_items.copy()
-        self.intermediate_items.clear()
-        
-        for ingredient in self.ingredient_manager.get_ingredients_list():
-            self.ingredient_manager.update_ingredient_amount(ingredient.name, 0)
+        self.submit_calculation(full=True)
 
-        for item in self.ui.get_equipment_children():
-            name = self.ui.get_equipment_value(item, "Name")
-            amount = int(self.ui.get_equipment_value(item, "Amount"))
-            sell_price = float(self.equipment_data[item]["sell_price"])
-
-            item_details = self.get_item_details(name)
-            if item_details and item_details.get('recipe'):
-                cost_per_unit = self.calculate_item_cost(item_details, amount, 1, name) / amount
-                
-                profit_per_unit = sell_price - cost_per_unit
-                self.ui.set_equipment_value(item, "Cost per Unit", self.format_number(int(cost_per_unit)))
-                self.ui.set_equipment_value(item, "Profit", self.format_number(int(profit_per_unit * amount)))
-                
-                # Update row color
-                self.ui.update_equipment_row_color(item)
-
-        for name, details in temp_intermediate_items.items():
-            if name in self.intermediate_items:
-                self.intermediate_items[name]['level'] = details['level']
-                if name in self.user_set_costs:
-                    self.intermediate_items[name]['cost'] = self.user_set_costs[name]
-                else:
-                    self.intermediate_items[name]['cost'] = details['cost']
-        
-        self.update_ingredients_list()
-        self.update_intermediate_items_list()
-        
     def update_single_item(self):
-        for item in self.ui.get_equipment_children():
-            name = self.ui.get_equipment_value(item, "Name")
-            amount = int(self.ui.get_equipment_value(item, "Amount"))
-            sell_price = float(self.equipment_data[item]["sell_price"])
+        # Accumulates onto the last calculate() state, so incremental repricing must wait for the next full pass
+        self.submit_calculation(full=False)
+
+    def submit_calculation(self, full):
+        # Recomputes run on a worker thread against a copy of the plan; results come back through check_calculation_complete
+        if self.calculation_worker.busy():
+            # A single-item pass builds on the last finished state, which a running job is about to replace
+            full = True
+        self.dependencies_valid = False
+        self.calculation_worker.submit(CalculationJob(self.snapshot(keep_results=not full), self.rows(), full))
+        if self.calculation_after_id is None:
+            self.calculation_after_id = self.master.after(CALCULATION_POLL_MS, self.check_calculation_complete)
+
+    def check_calculation_complete(self):
+        job = self.calculation_worker.poll()
+        if job is not None:
+            self.apply_calculation(job)
+        if self.calculation_worker.busy():
+            self.calculation_after_id = self.master.after(CALCULATION_POLL_MS, self.check_calculation_complete)
+        else:
+            self.calculation_after_id = None
 
-            item_details = self.get_item_details(name)
-            if item_details:
-                cost_per_unit = self.calculate_item_cost(item_details, 1, 1) / 1
-                
-                total_cost = cost_per_unit * amount
-                total_sell = sell_price * amount
-                profit = total_sell - total_cost
-                
-                self.ui.set_equipment_value(item, "Cost per Unit", self.format_number(int(cost_per_unit)))
-                self.ui.set_equipment_value(item, "Profit", self.format_number(int(profit)))
-
-                # Update row color
-                self.ui.update_equipment_row_color(item)
+    @profiler.timed('main.apply_calculation')
+    def apply_calculation(self, job):
+        self.adopt_results(job.calculator)
+        for key in self.apply_costs(job.rows, job.costs, job.full):
+            self.render_entry(key)
 
         self.update_ingredients_list()
         self.update_intermediate_items_list()
+        logger.debug(f"Item details cache: {self.item_details_cache.stats()}")
+
+    def render_entry(self, key):
+        entry = self.entries[key]
+        cost_per_unit = entry.cost_per_unit or 0
+        values = (entry.name, self.format_number(entry.amount), self.format_number(int(cost_per_unit)),
+                  self.format_number(int(entry.sell_price)), self.format_number(int(entry.profit)))
+        self.ui.set_equipment_row(key, values, entry.profit)
 
     def update_ingredients_list(self):
-        self.ui.clear_ingredients()
-        for ingredient_name, total_amount in self.total_amounts.items():
-            if ingredient_name in self.user_set_costs or ingredient_name not in self.intermediate_items:
-                ingredient = self.ingredient_manager.get_ingredient(ingredient_name)
-                cost = self.user_set_costs.get(ingredient_name, ingredient.cost if ingredient else 0)
-                ingredient_type = ingredient.type if ingredient else self.intermediate_items.get(ingredient_name, {}).get('type', 'Intermediate')
-                
-                # Check if it's an intermediate item
-                if ingredient_name in self.original_intermediate_items:
-                    ingredient_type = 'Intermediate'
-                
-                self.ui.insert_ingredient((ingredient_name, self.format_number(total_amount), self.format_number(int(cost)), ingredient_type))
-                
+        self.ui.populate_ingredients([
+            (name, self.format_number(amount), self.format_number(int(cost)), ingredient_type)
+            for name, amount, cost, ingredient_type in self.ingredient_rows()
+        ])
+
     def update_intermediate_items_list(self):
-        self.ui.clear_intermediate_items()
-        sorted_items = sorted(self.intermediate_items.items(), key=lambda x: x[1]['level'])
-        for name, details in sorted_items:
-            if name not in self.user_set_costs:
-                total_amount = self.total_amounts.get(name, 0)
-                self.ui.insert_intermediate_item((name, self.format_number(total_amount), self.format_number(int(details['cost'])), details['level']))
+        self.ui.populate_intermediate_items([
+            (name, self.format_number(amount), self.format_number(int(cost)), level)
+            for name, amount, cost, level in self.intermediate_rows()
+        ])
 
     def format_number(self, number):
         return f"{number:,}"
@@ -423,4 +600,7 @@ class DofusCraftimizer:
 if __name__ == "__main__":
     root = tk.Tk()
     app = DofusCraftimizer(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    app.save_plan()
+    if profiler.enabled:
+        app.save_profile()
\ No newline at end of file
@@ -1,5 +1,7 @@
 # models.py
 
+from array import array
+
 class Ingredient:
     def __init__(self, name, amount, cost, ingredient_type):
         self.name = name
@@ -40,4 +42,74 @@ class IngredientManager:
             self.ingredients[name].amount = amount
 
     def remove_ingredient(self, name):
-            self.ingredients.pop(name, None)
\ No newline at end of file
+            self.ingredients.pop(name, None)
+
+class PackedRecipe:
+    # Ingredient ids and quantities in flat int arrays; iterating yields (ankama_id, quantity, item_subtype)
+    __slots__ = ('ids', 'quantities', 'subtypes')
+
+    def __init__(self, ids=(), quantities=(), subtypes=()):
+        self.ids = array('i', ids)
+        self.quantities = array('i', quantities)
+        self.subtypes = tuple(subtypes)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return zip(self.ids, self.quantities, self.subtypes)
+
+    def __eq__(self, other):
+        return isinstance(other, PackedRecipe) and list(self) == list(other)
+
+    def __repr__(self):
+        return f"PackedRecipe({list(zip(self.ids, self.quantities))})"
+
+EMPTY_RECIPE = PackedRecipe()
+
+class ItemRecord:
+    # One catalog item with only the fields the app reads. item['name'] and item.get('recipe')
+    # keep working so code written against the API dicts doesn't need to change.
+    __slots__ = ('ankama_id', 'name', 'level', 'type', 'recipe')
+
+    def __init__(self, ankama_id, name, level='N/A', type='N/A', recipe=EMPTY_RECIPE):
+        self.ankama_id = ankama_id
+        self.name = name
+        self.level = level
+        self.type = type
+        self.recipe = recipe
+
+    @classmethod
+    def from_item(cls, item, shared=None):
+        # shared is reused across a whole catalog load so equal type dicts and subtype strings are stored once
+        shared = {} if shared is None else shared
+        type_data = item.get('type', 'N/A')
+        if isinstance(type_data, dict):
+            type_data = shared.setdefault(tuple(sorted(type_data.items())), type_data)
+
+        ingredients = [ingredient for ingredient in item.get('recipe') or [] if ingredient.get('item_ankama_id') is not None]
+        recipe = EMPTY_RECIPE
+        if ingredients:
+            recipe = PackedRecipe(
+                (ingredient['item_ankama_id'] for ingredient in ingredients),
+                (ingredient['quantity'] for ingredient in ingredients),
+                (shared.setdefault(ingredient.get('item_subtype'), ingredient.get('item_subtype')) for ingredient in ingredients)
+            )
+        return cls(item['ankama_id'], item['name'], item.get('level', 'N/A'), type_data, recipe)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def __eq__(self, other):
+        return isinstance(other, ItemRecord) and all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self):
+        return f"ItemRecord({self.ankama_id!r}, {self.name!r})"
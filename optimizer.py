@@ -0,0 +1,94 @@
+# optimizer.py
+
+from utils import process_recipe
+
+
+class MakeOrBuyOptimizer:
+    def __init__(self, calculator):
+        self.calculator = calculator
+        self._ingredients = {}
+
+    def get_ingredients(self, name):
+        # (ingredient name, quantity per unit, craftable) for one recipe, cached per catalog version
+        ingredients = self._ingredients.get(name)
+        if ingredients is None:
+            ingredients = []
+            item_details = self.calculator.get_item_details(name)
+            for ingredient in process_recipe((item_details or {}).get('recipe') or []):
+                ingredient_details = self.calculator.get_item_details(ingredient['ankama_id'])
+                if ingredient_details:
+                    ingredients.append((ingredient_details['name'], ingredient['amount'], bool(ingredient_details.get('recipe'))))
+            self._ingredients[name] = ingredients
+        return ingredients
+
+    def reachable(self, root_names):
+        # (craftable intermediates, raw resources) anywhere below the roots
+        intermediates = set()
+        raws = set()
+        stack = list(root_names)
+        while stack:
+            for ingredient_name, _, craftable in self.get_ingredients(stack.pop()):
+                if not craftable:
+                    raws.add(ingredient_name)
+                elif ingredient_name not in intermediates:
+                    intermediates.add(ingredient_name)
+                    stack.append(ingredient_name)
+        return intermediates, raws
+
+    def solve(self, roots, market_prices, raw_prices, bought):
+        # roots maps equipment name -> amount; bought holds the intermediates the current plan buys.
+        # Every node is evaluated once per call: best() and current() each memoize over the DAG.
+        best_memo = {}
+        current_memo = {}
+        decisions = {}
+
+        def craft_cost(name, cost_of):
+            return sum(quantity * cost_of(ingredient_name, craftable)
+                       for ingredient_name, quantity, craftable in self.get_ingredients(name))
+
+        def best(name, craftable):
+            if name in best_memo:
+                return best_memo[name]
+            if not craftable:
+                cost = raw_prices.get(name, 0)
+            else:
+                best_memo[name] = 0  # Guards against recipe cycles
+                crafted = craft_cost(name, best)
+                market = market_prices.get(name)
+                if market is not None and market < crafted:
+                    action, cost = 'buy', market
+                else:
+                    action, cost = 'craft', crafted
+                decisions[name] = {'action': action, 'market_price': market, 'craft_cost': crafted, 'cost': cost}
+            best_memo[name] = cost
+            return cost
+
+        def current(name, craftable):
+            if name in current_memo:
+                return current_memo[name]
+            if not craftable:
+                cost = raw_prices.get(name, 0)
+            elif name in bought:
+                cost = market_prices.get(name, 0)
+            else:
+                current_memo[name] = 0
+                cost = craft_cost(name, current)
+            current_memo[name] = cost
+            return cost
+
+        rows = {}
+        for name, amount in roots.items():
+            current_cost = craft_cost(name, current)
+            optimal_cost = craft_cost(name, best)
+            rows[name] = {
+                'amount': amount,
+                'current_cost': current_cost,
+                'optimal_cost': optimal_cost,
+                'savings': (current_cost - optimal_cost) * amount
+            }
+
+        return {
+            'decisions': decisions,
+            'rows': rows,
+            'savings': sum(row['savings'] for row in rows.values())
+        }
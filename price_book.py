@@ -0,0 +1,91 @@
+import os
+import time
+
+from sqlite_store import SqliteStore, batches
+
+PRICE_BOOK_FILE = 'prices.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prices (
+    ankama_id INTEGER PRIMARY KEY,
+    price REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS price_history (
+    ankama_id INTEGER NOT NULL,
+    price REAL,
+    recorded_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS price_history_item ON price_history(ankama_id, recorded_at);
+"""
+
+
+class PriceBook(SqliteStore):
+    schema = SCHEMA
+
+    def __init__(self, data_dir):
+        os.makedirs(data_dir, exist_ok=True)
+        super().__init__(os.path.join(data_dir, PRICE_BOOK_FILE))
+
+    def upsert_many(self, prices, timestamp=None):
+        # prices is an iterable of (ankama_id, price); everything lands in one transaction
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [(ankama_id, float(price), timestamp) for ankama_id, price in prices]
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO prices (ankama_id, price, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(ankama_id) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at",
+                rows
+            )
+            connection.executemany(
+                "INSERT INTO price_history (ankama_id, price, recorded_at) VALUES (?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def remove_many(self, ankama_ids, timestamp=None):
+        # A removal is kept in the history as a NULL price
+        timestamp = time.time() if timestamp is None else timestamp
+        ankama_ids = list(ankama_ids)
+        connection = self._connect()
+        with connection:
+            connection.executemany("DELETE FROM prices WHERE ankama_id = ?", ((ankama_id,) for ankama_id in ankama_ids))
+            connection.executemany(
+                "INSERT INTO price_history (ankama_id, price, recorded_at) VALUES (?, NULL, ?)",
+                ((ankama_id, timestamp) for ankama_id in ankama_ids)
+            )
+
+    def latest_prices(self, ankama_ids=None):
+        # One query per batch of ids, or a single scan when ankama_ids is None
+        connection = self._connect()
+        if ankama_ids is None:
+            return dict(connection.execute("SELECT ankama_id, price FROM prices"))
+
+        prices = {}
+        for batch in batches(ankama_ids):
+            placeholders = ', '.join('?' * len(batch))
+            prices.update(connection.execute(
+                f"SELECT ankama_id, price FROM prices WHERE ankama_id IN ({placeholders})", batch
+            ))
+        return prices
+
+    def last_known_prices(self, ankama_ids):
+        # Latest non-removed price from the history, so an item the user stopped buying keeps its market price
+        connection = self._connect()
+        prices = {}
+        for batch in batches(ankama_ids):
+            placeholders = ', '.join('?' * len(batch))
+            prices.update(connection.execute(
+                f"SELECT ankama_id, price FROM price_history WHERE ankama_id IN ({placeholders}) "
+                "AND price IS NOT NULL ORDER BY recorded_at", batch
+            ))
+        return prices
+
+    def history(self, ankama_id, since=None):
+        query = "SELECT recorded_at, price FROM price_history WHERE ankama_id = ?"
+        params = [ankama_id]
+        if since is not None:
+            query += " AND recorded_at >= ?"
+            params.append(since)
+        return self._connect().execute(query + " ORDER BY recorded_at", params).fetchall()
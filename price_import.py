@@ -0,0 +1,113 @@
+# price_import.py
+
+import csv
+import json
+import math
+import os
+from itertools import islice
+
+from data_access import data_access
+
+RESOLVE_BATCH = 1000  # Rows held and resolved against the catalog at a time, so large files stream in flat memory
+
+
+class PriceImport:
+    # What a price file held: name -> price and name -> ankama_id for every known item, (line, key) for items
+    # the catalog does not have and (line, reason) for rows that could not be read
+    def __init__(self):
+        self.prices = {}
+        self.ankama_ids = {}
+        self.unknown = []
+        self.invalid = []
+        self.rows = 0
+
+
+def iter_price_rows(path):
+    # Yields (line, key, price) as the file holds them; key is an ankama_id or an item name, None on a malformed row.
+    # CSV needs a 'price' column plus 'ankama_id' or 'name'; .jsonl holds one such object per line;
+    # .json is a list of such objects or a plain {name: price} object and is the only form read whole.
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, 'r', encoding='utf-8', newline='') as file:
+        if extension == '.json':
+            data = json.load(file)
+            if isinstance(data, dict):
+                rows = data.items()
+            else:
+                rows = ((row.get('ankama_id', row.get('name')), row.get('price')) if isinstance(row, dict) else (None, None)
+                        for row in data)
+            for line, (key, price) in enumerate(rows, 1):
+                yield line, key, price
+        elif extension == '.jsonl':
+            for line, text in enumerate(file, 1):
+                if not text.strip():
+                    continue
+                try:
+                    row = json.loads(text)
+                except ValueError:
+                    row = None
+                if isinstance(row, dict):
+                    yield line, row.get('ankama_id', row.get('name')), row.get('price')
+                else:
+                    yield line, None, None
+        else:
+            reader = csv.DictReader(file)
+            if reader.fieldnames is None or 'price' not in reader.fieldnames:
+                raise ValueError(f"{path} has no 'price' column")
+            try:
+                for row in reader:
+                    yield reader.line_num, row.get('ankama_id') or row.get('name'), row.get('price')
+            except csv.Error as e:
+                raise ValueError(f"{path}, line {reader.line_num}: {e}") from e
+
+
+def parse_price(value):
+    # Accepts numbers and strings with thousands separators such as '1,250' or '1 250'; None if not a price
+    if isinstance(value, str):
+        value = ''.join(value.replace(',', '').split())
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if math.isfinite(price) and price >= 0 else None
+
+
+def read_prices(path, batch_size=RESOLVE_BATCH):
+    # Later rows for the same item win, so a market log can be imported as is
+    imported = PriceImport()
+    rows = iter_price_rows(path)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return imported
+        _resolve_batch(batch, imported)
+
+
+def _resolve_batch(batch, imported):
+    # Names go to the catalog as one batch; ankama_ids are index hits
+    pending = []
+    names = set()
+    for line, key, value in batch:
+        imported.rows += 1
+        if isinstance(key, str):
+            key = key.strip()
+            if key.isdigit():
+                key = int(key)
+        if key is None or key == '' or isinstance(key, bool) or not isinstance(key, (int, str)):
+            imported.invalid.append((line, "not a row with an ankama_id or name"))
+            continue
+        price = parse_price(value)
+        if price is None:
+            imported.invalid.append((line, f"bad price {value!r}"))
+            continue
+        if isinstance(key, str):
+            names.add(key)
+        pending.append((line, key, price))
+
+    items = data_access.find_items_by_names(names) if names else {}
+    for line, key, price in pending:
+        item = items[key] if isinstance(key, str) else data_access.find_item_by_id(key)
+        if item is None:
+            imported.unknown.append((line, key))
+            continue
+        imported.prices[item.name] = price
+        imported.ankama_ids[item.name] = item.ankama_id
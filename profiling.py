@@ -0,0 +1,130 @@
+# profiling.py
+
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# '1' records spans and counters; 'cprofile' also runs cProfile on the Tk thread
+PROFILE_ENV = 'CRAFTIMIZER_PROFILE'
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.spans = {}  # name -> [count, total seconds, max seconds]
+        self.counters = {}
+        self.values = {}
+        self.profile = None
+        self.started = None
+        self._lock = threading.Lock()
+
+    def enable(self, use_cprofile=False):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = time.time()
+        if use_cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def add_span(self, name, seconds):
+        with self._lock:
+            span = self.spans.get(name)
+            if span is None:
+                self.spans[name] = [1, seconds, seconds]
+            else:
+                span[0] += 1
+                span[1] += seconds
+                span[2] = max(span[2], seconds)
+
+    @contextmanager
+    def span(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        # Decorator form of span
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.add_span(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def count(self, name, amount=1):
+        # Callers on hot paths check self.enabled first to skip the call entirely
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def maximum(self, name, value):
+        with self._lock:
+            if value > self.values.get(name, value - 1):
+                self.values[name] = value
+
+    def set_value(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+    def summary(self):
+        with self._lock:
+            spans = {
+                name: {
+                    'count': count,
+                    'total_ms': round(total * 1000, 3),
+                    'mean_ms': round(total * 1000 / count, 3),
+                    'max_ms': round(longest * 1000, 3)
+                }
+                for name, (count, total, longest) in sorted(self.spans.items(), key=lambda span: -span[1][1])
+            }
+            return {
+                'started': self.started,
+                'elapsed_s': round(time.time() - self.started, 3) if self.started else 0,
+                'spans': spans,
+                'counters': dict(sorted(self.counters.items())),
+                'values': dict(sorted(self.values.items()))
+            }
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f"Profile over {summary['elapsed_s']}s"]
+        for name, span in summary['spans'].items():
+            lines.append(f"  {name}: {span['count']} calls, {span['total_ms']} ms total, "
+                         f"{span['mean_ms']} ms mean, {span['max_ms']} ms max")
+        for name, value in list(summary['counters'].items()) + list(summary['values'].items()):
+            lines.append(f"  {name}: {value}")
+        return "\n".join(lines)
+
+    def dump(self, directory):
+        # Writes profile-<time>.json and, with cProfile running, profile-<time>.prof; returns the paths
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, time.strftime('profile-%Y%m%d-%H%M%S'))
+        paths = [stem + '.json']
+        with open(paths[0], 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(stem + '.prof')
+            self.profile.enable()
+            paths.append(stem + '.prof')
+        return paths
+
+
+profiler = Profiler()  # Shared by every module; enabled from the environment or the hidden shortcut
+if os.environ.get(PROFILE_ENV, '') not in ('', '0'):
+    profiler.enable(use_cprofile=os.environ[PROFILE_ENV].lower() == 'cprofile')
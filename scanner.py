@@ -0,0 +1,160 @@
+import argparse
+import csv
+import heapq
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from calculator import CraftCalculator
+from data_access import data_access
+from price_import import read_prices
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDS = ['ankama_id', 'name', 'level', 'type', 'cost', 'sell_price', 'profit', 'margin', 'unpriced_ingredients']
+
+_calculator = None
+
+def load_prices(path):
+    # Price file as {item name: price}; see price_import.iter_price_rows for the accepted formats
+    imported = read_prices(path)
+    if imported.unknown:
+        logger.warning(f"Skipped {len(imported.unknown)} prices for unknown items")
+    if imported.invalid:
+        logger.warning(f"Skipped {len(imported.invalid)} unreadable price rows")
+    return imported.prices
+
+def _init_worker(prices):
+    global _calculator
+    _calculator = CraftCalculator()
+    _calculator.user_set_costs.update(prices)
+
+def _scan_chunk(item_ids):
+    calculator = _calculator
+    results = []
+    for ankama_id in item_ids:
+        item_details = data_access.find_item_by_id(ankama_id)
+        name = item_details['name']
+
+        # The item's own price is its sell price; leaving it in user_set_costs would short-circuit the recipe
+        sell_price = calculator.user_set_costs.pop(name, None)
+        calculator.reset_calculation()
+        calculator.intermediate_items.clear()
+        calculator.ingredient_manager.clear_ingredients()
+        try:
+            cost = calculator.calculate_item_cost(item_details, 1, 1)
+        finally:
+            if sell_price is not None:
+                calculator.user_set_costs[name] = sell_price
+
+        unpriced = sum(1 for ingredient_name in calculator.total_amounts
+                       if ingredient_name not in calculator.intermediate_items
+                       and ingredient_name not in calculator.user_set_costs)
+        profit = (sell_price or 0) - cost
+        results.append({
+            'ankama_id': ankama_id,
+            'name': name,
+            'level': item_details['level'],
+            'type': calculator.get_clean_type(item_details['type']),
+            'cost': round(cost, 2),
+            'sell_price': sell_price,
+            'profit': round(profit, 2),
+            'margin': round(profit / cost, 4) if cost else None,
+            'unpriced_ingredients': unpriced
+        })
+    return results
+
+def select_items(min_level=None, max_level=None, types=None, prices=None):
+    wanted_types = {item_type.lower() for item_type in types} if types else None
+    calculator = CraftCalculator()
+    item_ids = []
+    for item in data_access.search_items('dofus_equipment.json', ''):
+        if not item['recipe']:
+            continue
+        level = item['level'] if isinstance(item['level'], int) else None
+        if min_level is not None and (level is None or level < min_level):
+            continue
+        if max_level is not None and (level is None or level > max_level):
+            continue
+        if wanted_types is not None and calculator.get_clean_type(item['type']).lower() not in wanted_types:
+            continue
+        if prices is not None and item['name'] not in prices:
+            continue
+        item_ids.append(item['ankama_id'])
+    return item_ids
+
+class ResultWriter:
+    def __init__(self, file, output_format):
+        self.file = file
+        self.output_format = output_format
+        if output_format == 'csv':
+            self.writer = csv.DictWriter(file, fieldnames=RESULT_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, result):
+        if self.output_format == 'csv':
+            self.writer.writerow(result)
+        else:
+            self.file.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+def scan(prices, item_ids, writer, top=None, workers=None, chunk_size=None):
+    if chunk_size is None:
+        # A few chunks per worker keeps every core busy without paying per-item task overhead
+        chunk_size = max(1, -(-len(item_ids) // ((workers or os.cpu_count() or 1) * 4)))
+    chunks = [item_ids[start:start + chunk_size] for start in range(0, len(item_ids), chunk_size)]
+    ranked = []
+    scanned = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(prices,)) as executor:
+        futures = [executor.submit(_scan_chunk, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            for result in future.result():
+                scanned += 1
+                if top is None:
+                    # Without a top-N cut there is nothing to rank, so rows stream out as chunks finish
+                    writer.write(result)
+                elif len(ranked) < top:
+                    heapq.heappush(ranked, (result['profit'], result['ankama_id'], result))
+                else:
+                    heapq.heappushpop(ranked, (result['profit'], result['ankama_id'], result))
+
+    for _, _, result in sorted(ranked, key=lambda entry: (-entry[0], entry[1])):
+        writer.write(result)
+    return scanned
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rank craftable equipment by profit without opening the GUI.")
+    parser.add_argument('prices', help="price file (.csv, .json or .jsonl) keyed by item name or ankama_id")
+    parser.add_argument('-o', '--output', help="output file (default: stdout)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="output format (default: from the output extension, else csv)")
+    parser.add_argument('--top', type=int, help="only write the N most profitable items")
+    parser.add_argument('--min-level', type=int)
+    parser.add_argument('--max-level', type=int)
+    parser.add_argument('--type', action='append', dest='types', help="equipment type to include, e.g. Ring (repeatable)")
+    parser.add_argument('--include-unpriced', action='store_true', help="also scan items with no sell price in the price file")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, help="items per worker task (default: four tasks per worker)")
+    args = parser.parse_args(argv)
+
+    output_format = args.format
+    if output_format is None:
+        output_format = 'jsonl' if args.output and args.output.lower().endswith('.jsonl') else 'csv'
+
+    prices = load_prices(args.prices)
+    item_ids = select_items(args.min_level, args.max_level, args.types, None if args.include_unpriced else prices)
+    logger.info(f"Scanning {len(item_ids)} items with {len(prices)} prices on {args.workers} workers")
+
+    output = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    try:
+        scanned = scan(prices, item_ids, ResultWriter(output, output_format), args.top, args.workers, args.chunk_size)
+    finally:
+        if args.output:
+            output.close()
+    logger.info(f"Scanned {scanned} items")
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
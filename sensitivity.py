@@ -0,0 +1,112 @@
+# sensitivity.py
+
+import numpy as np
+
+DEFAULT_SAMPLES = 10000
+DEFAULT_SPREAD = 0.2  # Resources without a range vary by +/-20% around their current price
+SAMPLE_BATCH = 2000  # Samples drawn per matrix product, which bounds memory on large plans
+PERCENTILES = (10, 50, 90)
+
+
+def sample_triangular(rng, low, mode, high, count):
+    # count draws per column with no branching: for uniform U1, U2, min + c * (max - min) is triangular on [0, 1]
+    # with mode c. Every column must have high > low. float32 halves the memory traffic, and the sampling noise
+    # dwarfs its rounding.
+    split = ((mode - low) / (high - low)).astype(np.float32)
+    uniform = rng.random((2, count, len(low)), dtype=np.float32)
+    values = np.maximum(uniform[0], uniform[1])
+    smaller = np.minimum(uniform[0], uniform[1], out=uniform[0])
+    values -= smaller
+    values *= split
+    values += smaller
+    values *= (high - low).astype(np.float32)
+    values += low.astype(np.float32)
+    return values
+
+
+class PriceSensitivity:
+    # Monte Carlo profit per plan entry: every bought resource gets a triangular price distribution,
+    # and each batch of sampled price vectors goes through the plan's flattened recipes as one matrix product.
+    def __init__(self, plan):
+        self.plan = plan
+        self.bom = plan.get_bill_of_materials()
+
+    def _leaf_quantities(self):
+        # Per-unit quantities of every bought leaf below each entry, with the same cuts as the cost engines
+        plan = self.plan
+        cut_ids = frozenset(ankama_id for name in plan.user_set_costs for ankama_id in self.bom.ids_by_name.get(name, ()))
+        memo = {}
+        keys = []
+        row_leaves = []
+        for key, entry in plan.entries.items():
+            item_details = plan.get_item_details(entry.name)
+            if not item_details or not item_details.get('recipe'):
+                continue
+            ankama_id = item_details['ankama_id']
+            if ankama_id in cut_ids:
+                leaves = {ankama_id: 1}
+            else:
+                leaves, _ = self.bom.explode(ankama_id, cut_ids, memo)
+            keys.append(key)
+            row_leaves.append(leaves)
+
+        leaf_ids = list(dict.fromkeys(leaf_id for leaves in row_leaves for leaf_id in leaves))
+        column_index = {leaf_id: column for column, leaf_id in enumerate(leaf_ids)}
+        quantities = np.zeros((len(leaf_ids), len(keys)), dtype=np.float64)
+        for row, leaves in enumerate(row_leaves):
+            for leaf_id, quantity in leaves.items():
+                quantities[column_index[leaf_id], row] = quantity
+        return keys, leaf_ids, quantities
+
+    def _price_ranges(self, leaf_ids, ranges, spread):
+        # (low, mode, high) per leaf: the mode is the price the plan uses now
+        plan = self.plan
+        low = np.empty(len(leaf_ids))
+        mode = np.empty(len(leaf_ids))
+        high = np.empty(len(leaf_ids))
+        for column, leaf_id in enumerate(leaf_ids):
+            name = self.bom.names[leaf_id]
+            price = plan.user_set_costs.get(name, plan.ingredient_manager.get_ingredient_cost(name))
+            range_low, range_high = ranges.get(name, (price * (1 - spread), price * (1 + spread)))
+            low[column] = min(range_low, range_high)
+            high[column] = max(range_low, range_high)
+            mode[column] = min(max(price, low[column]), high[column])
+        return low, mode, high
+
+    def run(self, samples=DEFAULT_SAMPLES, ranges=None, spread=DEFAULT_SPREAD, seed=None):
+        # ranges maps resource name -> (low, high). Returns entry key -> p10 / p50 / p90 / mean profit
+        # and loss_probability, for every entry with a recipe.
+        keys, leaf_ids, quantities = self._leaf_quantities()
+        if not keys:
+            return {}
+        low, mode, high = self._price_ranges(leaf_ids, ranges or {}, spread)
+        entries = [self.plan.entries[key] for key in keys]
+        sell_prices = np.array([entry.sell_price for entry in entries], dtype=np.float64)
+        amounts = np.array([entry.amount for entry in entries], dtype=np.float64)
+
+        # Leaves with a fixed price, unpriced ones included, add the same cost to every sample
+        varying = high > low
+        fixed_costs = low[~varying] @ quantities[~varying]
+        low, mode, high = low[varying], mode[varying], high[varying]
+        quantities = quantities[varying].astype(np.float32)
+
+        rng = np.random.default_rng(seed)
+        profits = np.empty((samples, len(keys)), dtype=np.float64)
+        for start in range(0, samples, SAMPLE_BATCH):
+            count = min(SAMPLE_BATCH, samples - start)
+            unit_costs = sample_triangular(rng, low, mode, high, count) @ quantities + fixed_costs
+            profits[start:start + count] = (sell_prices - unit_costs) * amounts
+
+        percentiles = np.percentile(profits, PERCENTILES, axis=0)
+        means = profits.mean(axis=0)
+        loss_probabilities = (profits < 0).mean(axis=0)
+        return {
+            key: {
+                'p10': float(percentiles[0, row]),
+                'p50': float(percentiles[1, row]),
+                'p90': float(percentiles[2, row]),
+                'mean': float(means[row]),
+                'loss_probability': float(loss_probabilities[row])
+            }
+            for row, key in enumerate(keys)
+        }
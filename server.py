@@ -0,0 +1,248 @@
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from craft_plan import CraftPlan
+from data_access import data_access
+from profiling import profiler
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 16
+SEARCH_LIMIT = 50
+MAX_BODY_BYTES = 1024 * 1024
+IDLE_TIMEOUT = 5  # Seconds a keep-alive connection may sit idle before its worker is freed
+CATALOGS = {
+    'equipment': 'dofus_equipment.json',
+    'resources': 'dofus_resources.json',
+    'consumables': 'dofus_consumables.json'
+}
+
+
+class RequestError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class CraftimizerAPI:
+    # Request handling without any HTTP: every request reads the one shared catalog and indexes, and
+    # cost requests price a throwaway CraftPlan, so requests never share mutable state.
+    def __init__(self):
+        data_access.warm_up()
+        self.calculator = CraftPlan()
+        if self.calculator.use_bom:
+            self.calculator.get_bill_of_materials()
+
+    def new_plan(self):
+        plan = CraftPlan()
+        plan.use_bom = self.calculator.use_bom
+        plan.bom = self.calculator.bom
+        plan.item_details_cache = self.calculator.item_details_cache
+        return plan
+
+    def resolve(self, key):
+        # Item by ankama_id (an int or a string of digits) or by name
+        if isinstance(key, int) or (isinstance(key, str) and key.isdigit()):
+            return data_access.find_item_by_id(int(key))
+        if isinstance(key, str):
+            return data_access.find_item_by_name(key)
+        return None
+
+    def summarize(self, item):
+        return {
+            'ankama_id': item.ankama_id,
+            'name': item.name,
+            'level': item.level,
+            'type': self.calculator.get_clean_type(item.type)
+        }
+
+    @profiler.timed('server.search')
+    def search(self, params):
+        query = params.get('q', '')
+        catalog = CATALOGS.get(params.get('catalog', 'equipment'))
+        if catalog is None:
+            raise RequestError(f"Unknown catalog, expected one of: {', '.join(CATALOGS)}")
+        try:
+            limit = min(int(params.get('limit', SEARCH_LIMIT)), 1000)
+        except ValueError:
+            raise RequestError("limit must be an integer")
+        results = data_access.search_items(catalog, query)
+        return {'total': len(results), 'items': [self.summarize(item) for item in results[:limit]]}
+
+    @profiler.timed('server.item')
+    def item(self, ankama_id):
+        item = data_access.find_item_by_id(ankama_id)
+        if item is None:
+            raise RequestError(f"No item with id {ankama_id}", status=404)
+        details = self.summarize(item)
+        recipe = []
+        for ingredient_id, quantity, item_subtype in item.recipe:
+            ingredient = data_access.find_item_by_id(ingredient_id)
+            recipe.append({
+                'ankama_id': ingredient_id,
+                'name': ingredient.name if ingredient else None,
+                'quantity': quantity,
+                'item_subtype': item_subtype
+            })
+        details['recipe'] = recipe
+        return details
+
+    @profiler.timed('server.costs')
+    def costs(self, payload):
+        # payload: {"items": [{"name" or "ankama_id", "amount", "sell_price"}], "prices": {name or ankama_id: price}}
+        if not isinstance(payload, dict) or not isinstance(payload.get('items'), list):
+            raise RequestError("Expected a JSON object with an 'items' list")
+        plan = self.new_plan()
+        unknown = []
+        try:
+            for key, price in (payload.get('prices') or {}).items():
+                item = self.resolve(key)
+                if item is None:
+                    unknown.append(key)
+                else:
+                    plan.user_set_costs[item.name] = float(price)
+
+            keys = []
+            for spec in payload['items']:
+                item_key = spec.get('ankama_id', spec.get('name'))
+                item = self.resolve(item_key)
+                if item is None:
+                    unknown.append(item_key)
+                    keys.append(None)
+                    continue
+                key, created = plan.add_entry(item.name, int(spec.get('amount', 1)), float(spec.get('sell_price', 0)))
+                if not created:
+                    plan.entries[key].sell_price = float(spec.get('sell_price', 0))
+                keys.append(key)
+        except (AttributeError, TypeError, ValueError) as e:
+            raise RequestError(f"Malformed items or prices: {e}")
+
+        plan.recompute()
+        items = []
+        for key in keys:
+            if key is None:
+                continue
+            entry = plan.entries[key]
+            items.append({
+                'name': entry.name,
+                'amount': entry.amount,
+                'sell_price': entry.sell_price,
+                'cost_per_unit': entry.cost_per_unit,
+                'profit': entry.profit if entry.cost_per_unit is not None else None
+            })
+        return {
+            'items': items,
+            'ingredients': [
+                {'name': name, 'amount': amount, 'cost': cost, 'type': ingredient_type}
+                for name, amount, cost, ingredient_type in plan.ingredient_rows()
+            ],
+            'unknown': unknown
+        }
+
+
+class CraftimizerRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so a client reuses one connection for many requests
+    timeout = IDLE_TIMEOUT
+    disable_nagle_algorithm = True  # Headers and body go out as separate writes; without this each response waits on a delayed ACK
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == '/search':
+            self.respond(lambda: self.server.api.search(params))
+        elif url.path.startswith('/items/') and url.path[len('/items/'):].isdigit():
+            self.respond(lambda: self.server.api.item(int(url.path[len('/items/'):])))
+        elif url.path == '/health':
+            self.respond(lambda: {'status': 'ok', 'catalog_version': data_access.catalog_version})
+        else:
+            self.send_json(404, {'error': f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        if urlsplit(self.path).path != '/costs':
+            self.send_json(404, {'error': f"Unknown path {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            self.send_json(413, {'error': "Request body too large"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b'null')
+        except ValueError:
+            self.send_json(400, {'error': "Request body is not valid JSON"})
+            return
+        self.respond(lambda: self.server.api.costs(payload))
+
+    def respond(self, handler):
+        try:
+            body = handler()
+        except RequestError as e:
+            self.send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            logger.exception(f"Error handling {self.command} {self.path}")
+            self.send_json(500, {'error': f"Internal error: {e}"})
+        else:
+            self.send_json(200, body)
+
+    def send_json(self, status, body):
+        data = json.dumps(body, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+class CraftimizerServer(HTTPServer):
+    # Connections are served by a fixed pool of threads instead of a new thread each
+    request_queue_size = 128
+
+    def __init__(self, address, api, workers=DEFAULT_WORKERS):
+        super().__init__(address, CraftimizerRequestHandler)
+        self.api = api
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='craftimizer-http')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve item search and craft costs over HTTP without the GUI.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to bind (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help=f"request threads (default: {DEFAULT_WORKERS})")
+    args = parser.parse_args(argv)
+
+    logger.info("Loading catalog")
+    server = CraftimizerServer((args.host, args.port), CraftimizerAPI(), args.workers)
+    logger.info(f"Serving on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import sqlite3
+import threading
+
+# SQLite caps the number of bound parameters per statement
+BATCH_SIZE = 900
+
+
+def batches(values, size=BATCH_SIZE):
+    # Lists of at most size values, one per IN (...) query
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class SqliteStore:
+    # One connection per thread to a database file, opened on first use with WAL and the store's schema
+    schema = ""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _prepare(self, connection):
+        # Runs on every new connection before the schema
+        pass
+
+    def _connect(self):
+        # sqlite3 connections are bound to the thread that opened them
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            self._prepare(connection)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(self.schema)
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,62 @@
+import json
+import random
+
+import pytest
+
+from api_importer import iter_json_array
+
+DOCUMENT = {
+    'before': -5.25,
+    'count': 1e3,
+    'nested': {'values': [1, -2.5e-3, True, None, "x"]},
+    'items': [
+        {'ankama_id': 1, 'name': 'Épée du Bouftou', 'level': 10, 'price': -0.5},
+        -12,
+        3.0E+2,
+        0,
+        "Œil de Chafer",
+        False,
+        {'ankama_id': 2, 'recipe': [{'item_ankama_id': 1, 'quantity': 12}]}
+    ],
+    'total': 12345678901234567890,
+    'after': 2.5E-7
+}
+
+
+def encoded(document, indent=None):
+    return json.dumps(document, ensure_ascii=False, indent=indent).encode('utf-8')
+
+
+@pytest.mark.parametrize('indent', [None, 2])
+def test_split_at_every_byte_offset(indent):
+    data = encoded(DOCUMENT, indent)
+    for offset in range(len(data) + 1):
+        assert list(iter_json_array([data[:offset], data[offset:]])) == DOCUMENT['items'], offset
+
+
+def test_number_cut_before_fraction():
+    assert list(iter_json_array([b'{"before": -', b'5.', b'25, "items": []}'])) == []
+    assert list(iter_json_array([b'{"items": [1', b'e3, -2.', b'5E-1, 1', b'0]}'])) == [1000.0, -0.25, 10]
+
+
+def test_random_chunks():
+    rng = random.Random(0)
+    for _ in range(400):
+        items = [rng.choice([rng.randint(-10 ** 6, 10 ** 6), rng.uniform(-1e6, 1e6), rng.random() * 10 ** rng.randint(-20, 20),
+                             {'ankama_id': rng.randint(1, 10 ** 5), 'weight': rng.uniform(-5, 5)}])
+                 for _ in range(rng.randint(0, 20))]
+        data = encoded({'before': rng.uniform(-1e3, 1e3), 'items': items, 'after': rng.randint(-100, 100)})
+        cuts = sorted(rng.sample(range(len(data) + 1), min(len(data), rng.randint(1, 30))))
+        chunks = [data[start:end] for start, end in zip([0] + cuts, cuts + [len(data)])]
+        assert list(iter_json_array(chunks)) == items
+
+
+def test_one_byte_chunks():
+    data = encoded(DOCUMENT)
+    assert list(iter_json_array(data[offset:offset + 1] for offset in range(len(data)))) == DOCUMENT['items']
+
+
+def test_truncated_document_raises():
+    data = encoded(DOCUMENT)
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_array([data[:len(data) // 2]]))
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+
+import api_importer
+from data_access import data_access, catalog_path, CATALOG_FILES, CATALOG_META_FILE
+
+
+def catalog(file_name, renamed=None):
+    # A few API-shaped items per file, with distinct ids across files
+    base = CATALOG_FILES.index(file_name) * 100
+    items = []
+    for offset in range(1, 6):
+        ankama_id = base + offset
+        items.append({
+            'ankama_id': ankama_id,
+            'name': renamed if renamed and offset == 1 else f"{file_name.split('_')[1].split('.')[0]} {ankama_id}",
+            'level': offset * 10,
+            'type': {'name': 'Wood', 'id': 1},
+            'description': 'Not kept on disk',
+            'recipe': [{'item_ankama_id': 1, 'quantity': 2, 'item_subtype': 'resources'}] if base else None
+        })
+    return {'items': items}
+
+
+class CatalogServer(ThreadingHTTPServer):
+    # path -> (etag, body); answers 304 when If-None-Match carries the current ETag
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), CatalogHandler)
+        self.documents = {}
+        self.requests = []
+
+    def publish(self, file_name, etag, document):
+        self.documents['/' + file_name] = (etag, json.dumps(document).encode('utf-8'))
+
+    def url(self, file_name):
+        return f"http://127.0.0.1:{self.server_address[1]}/{file_name}"
+
+
+class CatalogHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        etag, body = self.server.documents[self.path]
+        self.server.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = CatalogServer()
+    for file_name in CATALOG_FILES:
+        server.publish(file_name, '"v1"', catalog(file_name))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_importer, 'get_data_dir', lambda: str(tmp_path))
+    monkeypatch.setattr(data_access, 'data_dir', str(tmp_path))
+    monkeypatch.setattr(data_access, 'backend', 'json')
+    monkeypatch.setattr(data_access, '_database', None)
+    data_access.reload()
+    yield tmp_path
+    monkeypatch.undo()
+    data_access.reload()
+
+
+@pytest.fixture
+def snapshot_writes(monkeypatch):
+    writes = []
+    write_snapshot = data_access.write_snapshot
+
+    def counted():
+        writes.append(time.time())
+        write_snapshot()
+    monkeypatch.setattr(data_access, 'write_snapshot', counted)
+    return writes
+
+
+def expire(data_dir):
+    # As if the last check was two days ago
+    meta_path = os.path.join(data_dir, CATALOG_META_FILE)
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    for entry in meta.values():
+        entry['checked_at'] -= 2 * 24 * 3600
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return meta
+
+
+def mtimes(data_dir):
+    return {file_name: os.stat(catalog_path(str(data_dir), file_name)).st_mtime_ns for file_name in CATALOG_FILES}
+
+
+def refresh(server):
+    return api_importer.update_dofus_data(data_files={file_name: server.url(file_name) for file_name in CATALOG_FILES})
+
+
+def test_first_download_builds_snapshot(server, data_dir, snapshot_writes):
+    diffs = refresh(server)
+    assert len(snapshot_writes) == 1
+    assert all(len(diff['added']) == 5 and not diff['removed'] and not diff['changed'] for diff in diffs.values())
+    assert all(value[0] == 'digest' for value in data_access.catalog_signature().values())
+    assert data_access.find_item_by_id(101).name == 'equipment 101'
+
+
+def test_recent_check_makes_no_request(server, data_dir, snapshot_writes):
+    refresh(server)
+    server.requests.clear()
+    assert refresh(server) == {}
+    assert server.requests == []
+    assert len(snapshot_writes) == 1
+
+
+def test_not_modified_leaves_files_and_snapshot(server, data_dir, snapshot_writes):
+    refresh(server)
+    signature = data_access.catalog_signature()
+    before = mtimes(data_dir)
+    expired = expire(data_dir)
+    server.requests.clear()
+
+    assert refresh(server) == {}
+    assert sorted(server.requests) == sorted(('/' + file_name, '"v1"') for file_name in CATALOG_FILES)
+    assert len(snapshot_writes) == 1
+    assert mtimes(data_dir) == before
+    assert data_access.catalog_signature() == signature
+    assert data_access.snapshot_is_current()
+    meta = api_importer.load_catalog_meta(str(data_dir))
+    assert all(meta[file_name]['checked_at'] > expired[file_name]['checked_at'] for file_name in CATALOG_FILES)
+    assert not api_importer.check_file_age(CATALOG_FILES[0], meta[CATALOG_FILES[0]])
+
+
+def test_unchanged_items_under_new_etag_keep_snapshot(server, data_dir, snapshot_writes):
+    refresh(server)
+    signature = data_access.catalog_signature()
+    for file_name in CATALOG_FILES:
+        server.publish(file_name, '"v2"', catalog(file_name))
+    expire(data_dir)
+
+    diffs = refresh(server)
+    assert all(not (diff['added'] or diff['removed'] or diff['changed']) for diff in diffs.values())
+    assert len(snapshot_writes) == 1
+    assert data_access.catalog_signature() == signature
+    assert data_access.snapshot_is_current()
+
+
+def test_changed_item_rebuilds_snapshot(server, data_dir, snapshot_writes):
+    refresh(server)
+    signature = data_access.catalog_signature()
+    server.publish('dofus_equipment.json', '"v2"', catalog('dofus_equipment.json', renamed='Renamed hat'))
+    expire(data_dir)
+
+    diffs = refresh(server)
+    assert diffs == {'dofus_equipment.json': {'added': [], 'removed': [], 'changed': [101]}}
+    assert len(snapshot_writes) == 2
+    assert data_access.catalog_signature() != signature
+    assert data_access.find_item_by_id(101).name == 'Renamed hat'
@@ -0,0 +1,32 @@
+import pytest
+
+from benchmark import generate_catalog, write_catalog
+from catalog_db import SqliteCatalog
+from data_access import data_access
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def catalog(request, tmp_path, monkeypatch):
+    write_catalog(generate_catalog(2000, 3, 3, seed=1), str(tmp_path))
+    monkeypatch.setattr(data_access, 'data_dir', str(tmp_path))
+    monkeypatch.setattr(data_access, 'backend', request.param)
+    monkeypatch.setattr(data_access, '_database', SqliteCatalog(str(tmp_path)) if request.param == 'sqlite' else None)
+    data_access.reload()
+    yield
+    monkeypatch.undo()
+    data_access.reload()
+
+
+@pytest.mark.parametrize('keystrokes', [['a', 'ar'], ['b', 'bo', 'bou'], ['to', 'tof', 'tofu'], ['g', 'go', 'gob ']])
+def test_narrowing_matches_a_fresh_search(catalog, keystrokes):
+    entries = data_access.search_entries('dofus_equipment.json', keystrokes[0])
+    for query in keystrokes[1:]:
+        entries = data_access.narrow_results(entries, query)
+        fresh = data_access.search_items('dofus_equipment.json', query)
+        assert [item.ankama_id for _, item in entries] == [item.ankama_id for item in fresh]
+
+
+def test_ranks_exact_then_prefix_then_substring(catalog):
+    results = data_access.search_items('dofus_equipment.json', 'bou')
+    ranks = [0 if item.name.lower() == 'bou' else 1 if item.name.lower().startswith('bou') else 2 for item in results]
+    assert results and ranks == sorted(ranks)
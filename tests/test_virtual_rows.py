@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+from ui import VirtualRows
+
+
+class StubTree:
+    # The parts of ttk.Treeview that VirtualRows uses, with Tk's index rules: move() takes the row out
+    # before counting the index, and an index past the end means the end
+    def __init__(self, columns):
+        self.columns = columns
+        self.children = []
+        self.values = {}
+        self.tags = {}
+        self.next_id = 0
+
+    def __getitem__(self, option):
+        assert option == 'columns'
+        return self.columns
+
+    def configure(self, **options):
+        pass
+
+    def get_children(self):
+        return tuple(self.children)
+
+    def insert(self, parent, index, values=(), tags=()):
+        self.next_id += 1
+        item = f"I{self.next_id}"
+        self.children.insert(len(self.children) if index == "end" else index, item)
+        self.values[item] = list(values)
+        self.tags[item] = tags
+        return item
+
+    def move(self, item, parent, index):
+        self.children.remove(item)
+        self.children.insert(index, item)
+
+    def delete(self, *items):
+        for item in items:
+            self.children.remove(item)
+            del self.values[item]
+
+    def set(self, item, column, value):
+        self.values[item][self.columns.index(column)] = value
+
+    def item(self, item, tags=None):
+        self.tags[item] = tags
+
+    def after_cancel(self, pending):
+        pass
+
+
+class StubScrollbar:
+    def set(self, first, last):
+        pass
+
+
+def make_rows(keys):
+    return [(key, f"{key} cost") for key in keys]
+
+
+def make_row(row):
+    return row, ()
+
+
+def shown_rows(rows):
+    return [tuple(rows.tree.values[item]) for item in rows.tree.get_children()]
+
+
+@pytest.fixture
+def rows():
+    return VirtualRows(StubTree(('Name', 'Cost')), StubScrollbar(), key=lambda row: row[0])
+
+
+def patch(rows, keys):
+    rows.patch_rows(make_rows(keys), make_row)
+    shown = [values[0] for values in shown_rows(rows)]
+    assert shown == rows.order == list(keys)
+    assert [rows.item_keys[item] for item in rows.tree.get_children()] == rows.order
+
+
+@pytest.mark.parametrize('before, after', [
+    ('KABC', 'ABKC'),  # forward past rows that stay
+    ('ABKC', 'KABC'),  # backward
+    ('ABCDE', 'BCDEA'),
+    ('ABCDE', 'EABCD'),
+    ('ABCDE', 'EDCBA'),
+    ('ABC', 'AXBYCZ'),  # inserts
+    ('ABCDE', 'BD'),  # deletes
+    ('ABCDE', 'XEBQA'),  # all at once
+    ('', 'ABC'),
+    ('ABC', '')
+])
+def test_patch_matches_order(rows, before, after):
+    rows.set_rows(make_rows(before), make_row)
+    patch(rows, after)
+
+
+def test_values_and_tags_patched_in_place(rows):
+    rows.set_rows(make_rows('ABC'), make_row)
+    items = rows.tree.get_children()
+    rows.patch_rows([('C', 'new'), ('A', 'A cost'), ('B', 'B cost')], lambda row: (row, ('hot',) if row[0] == 'B' else ()))
+    assert shown_rows(rows) == [('C', 'new'), ('A', 'A cost'), ('B', 'B cost')]
+    assert set(rows.tree.get_children()) == set(items)
+    assert rows.tree.tags[rows.item_ids['B']] == ('hot',)
+
+
+def test_random_patch_sequences(rows):
+    rng = random.Random(0)
+    pool = [f"K{number}" for number in range(40)]
+    rows.set_rows(make_rows(rng.sample(pool, 20)), make_row)
+    for _ in range(300):
+        patch(rows, rng.sample(pool, rng.randint(0, 30)))
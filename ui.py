@@ -1,5 +1,178 @@
 import tkinter as tk
-from tkinter import ttk
+from bisect import bisect_left
+from itertools import islice
+from tkinter import filedialog, ttk
+
+from profiling import profiler
+
+def stable_keys(keys, position):
+    # Longest run of keys already in increasing tree order; those rows can stay where they are
+    tails = []
+    tail_keys = []
+    previous = {}
+    for key in keys:
+        index = bisect_left(tails, position[key])
+        previous[key] = tail_keys[index - 1] if index else None
+        if index == len(tails):
+            tails.append(position[key])
+            tail_keys.append(key)
+        else:
+            tails[index] = position[key]
+            tail_keys[index] = key
+    stable = set()
+    key = tail_keys[-1] if tail_keys else None
+    while key is not None:
+        stable.add(key)
+        key = previous[key]
+    return stable
+
+class VirtualRows:
+    # Holds every row of a Treeview in Python and only inserts a page at a time, loading the
+    # next page once the view scrolls near the last inserted row
+    PAGE_SIZE = 100
+    PREFETCH_AT = 0.9  # fraction of the inserted rows scrolled past before the next page loads
+
+    def __init__(self, tree, scrollbar, key=None):
+        # With key(row), inserted rows are tracked by key so patch_rows can update them in place
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.key = key
+        self.columns = tree['columns']
+        self.rows = []
+        self.make_row = None
+        self.shown = 0
+        self.pending = None
+        self.item_ids = {}
+        self.item_keys = {}
+        self.cells = {}
+        self.order = []
+        tree.configure(yscrollcommand=self.on_scroll)
+
+    def clear(self):
+        # A single Tk call, however many rows are inserted
+        if self.pending is not None:
+            self.tree.after_cancel(self.pending)
+            self.pending = None
+        self.tree.delete(*self.tree.get_children())
+        self.rows = []
+        self.shown = 0
+        self.item_ids.clear()
+        self.item_keys.clear()
+        self.cells.clear()
+        self.order = []
+
+    def set_rows(self, rows, make_row):
+        # make_row(row) -> (values, tags) runs only for rows that actually get inserted
+        self.clear()
+        self.rows = rows
+        self.make_row = make_row
+        self.show_more()
+
+    def _insert(self, key, index, values, tags):
+        if profiler.enabled:
+            profiler.count('ui.treeview_insert')
+        item = self.tree.insert("", index, values=values, tags=tags)
+        if self.key is not None:
+            self.item_ids[key] = item
+            self.item_keys[item] = key
+            self.cells[key] = (values, tags)
+        return item
+
+    def show_more(self):
+        self.pending = None
+        end = min(self.shown + self.PAGE_SIZE, len(self.rows))
+        for row in islice(self.rows, self.shown, end):
+            values, tags = self.make_row(row)
+            key = self.key(row) if self.key is not None else None
+            self._insert(key, "end", values, tags)
+            if self.key is not None:
+                self.order.append(key)
+        self.shown = end
+
+    def patch_rows(self, rows, make_row):
+        # Same result as set_rows, but rows already inserted are moved, edited cell by cell or deleted
+        # instead of rebuilt, so scroll position and selection survive and unchanged rows cost nothing
+        self.rows = rows
+        self.make_row = make_row
+        target = min(len(rows), max(self.shown, self.PAGE_SIZE))
+        desired = [(self.key(row), row) for row in islice(rows, target)]
+        wanted = {key for key, _ in desired}
+
+        removed = [self.item_ids.pop(key) for key in self.order if key not in wanted]
+        if removed:
+            if profiler.enabled:
+                profiler.count('ui.treeview_delete', len(removed))
+            self.tree.delete(*removed)
+            for item in removed:
+                del self.cells[self.item_keys.pop(item)]
+        order = [key for key in self.order if key in wanted]
+
+        position = {key: index for index, key in enumerate(order)}
+        stable = stable_keys([key for key, _ in desired if key in position], position)
+
+        previous = None
+        for key, row in desired:
+            values, tags = make_row(row)
+            item = self.item_ids.get(key)
+            if item is None or key not in stable:
+                # Tk counts a moved row's index with the row already out of the list, so it leaves order first
+                # and the tree and order get the same index: right after the previous desired row
+                start = len(order)
+                if item is not None:
+                    start = position.pop(key)
+                    del order[start]
+                index = 0
+                if previous is not None:
+                    index = position[previous] + (0 if position[previous] > start else 1)
+                order.insert(index, key)
+                # Only the rows between the old and the new position shift
+                for offset in range(min(start, index), max(start, index) + 1):
+                    position[order[offset]] = offset
+                if item is None:
+                    self._insert(key, index, values, tags)
+                    previous = key
+                    continue
+                if profiler.enabled:
+                    profiler.count('ui.treeview_move')
+                self.tree.move(item, "", index)
+            old_values, old_tags = self.cells[key]
+            for column, old_value, new_value in zip(self.columns, old_values, values):
+                if old_value != new_value:
+                    if profiler.enabled:
+                        profiler.count('ui.treeview_set')
+                    self.tree.set(item, column, new_value)
+            if old_tags != tags:
+                self.tree.item(item, tags=tags)
+            self.cells[key] = (values, tags)
+            previous = key
+
+        self.order = order
+        self.shown = target
+
+    def get_item(self, key):
+        return self.item_ids.get(key)
+
+    def set_value(self, key, column, value):
+        # Keeps the tracked cell in step with the tree, so the next patch compares against what is shown
+        column_index = int(column[1:]) - 1 if column.startswith('#') else self.columns.index(column)
+        item = self.item_ids.get(key)
+        if item is not None:
+            self.tree.set(item, column, value)
+            values, tags = self.cells[key]
+            self.cells[key] = (values[:column_index] + (value,) + values[column_index + 1:], tags)
+        else:
+            # Not inserted yet: patch the pending row, which must be a values tuple
+            for index in range(self.shown, len(self.rows)):
+                row = self.rows[index]
+                if self.key(row) == key:
+                    self.rows[index] = row[:column_index] + (value,) + row[column_index + 1:]
+                    break
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if self.pending is None and self.shown < len(self.rows) and float(last) >= self.PREFETCH_AT:
+            # Deferred so the insert doesn't run inside Tk's own scroll update
+            self.pending = self.tree.after_idle(self.show_more)
 
 class StyledDofusCraftimizerUI:
     def __init__(self, master, controller):
@@ -31,6 +204,8 @@ class StyledDofusCraftimizerUI:
         self.style.map('TEntry', fieldbackground=[('focus', bg_light)])
         self.style.configure('TButton', background=bg_light, foreground=light_grey, bordercolor=border_color)
         self.style.map('TButton', background=[('active', border_color)])
+        self.style.configure('TCheckbutton', background=bg_dark, foreground=light_grey, font=('Arial', 10))
+        self.style.map('TCheckbutton', background=[('active', bg_dark)], indicatorcolor=[('selected', accent_color)])
 
         # Configure Treeview styles with larger font
         self.style.configure('Treeview', background=bg_dark, fieldbackground=bg_dark, foreground=light_grey, bordercolor=border_color, highlightthickness=0, font=('Arial', 12))
@@ -92,6 +267,20 @@ class StyledDofusCraftimizerUI:
         search_entry.pack(side=tk.LEFT, expand=True, fill=tk.X, ipady=5)
         search_entry.bind("<Return>", self.controller.search_equipment)
 
+        self.live_search_var = tk.BooleanVar(value=True)
+        live_search_check = ttk.Checkbutton(search_frame, text="Search as you type", variable=self.live_search_var)
+        live_search_check.pack(side=tk.LEFT, padx=(10, 0))
+        self.search_var.trace_add('write', self.controller.schedule_search)
+
+        optimize_button = ttk.Button(search_frame, text="Optimize make/buy", command=self.controller.optimize_make_or_buy)
+        optimize_button.pack(side=tk.RIGHT, padx=(10, 0))
+
+        risk_button = ttk.Button(search_frame, text="Price risk", command=self.controller.show_price_risk)
+        risk_button.pack(side=tk.RIGHT, padx=(10, 0))
+
+        import_button = ttk.Button(search_frame, text="Import prices", command=self.controller.import_prices)
+        import_button.pack(side=tk.RIGHT, padx=(10, 0))
+
         # Results and Equipment frame
         results_equipment_frame = ttk.Frame(self.main_frame, style='TFrame')
         results_equipment_frame.pack(expand=True, fill=tk.BOTH, padx=10, pady=5)
@@ -111,7 +300,7 @@ class StyledDofusCraftimizerUI:
 
         results_scrollbar = ttk.Scrollbar(results_frame, orient="vertical", command=self.results_tree.yview, style="Custom.Vertical.TScrollbar")
         results_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.results_tree.configure(yscrollcommand=results_scrollbar.set)
+        self.results_rows = VirtualRows(self.results_tree, results_scrollbar)
 
         # Equipment list frame
         equipment_frame = ttk.LabelFrame(results_equipment_frame, text="Equipment List", style='Card.TLabelframe')
@@ -133,6 +322,8 @@ class StyledDofusCraftimizerUI:
         equipment_scrollbar = ttk.Scrollbar(equipment_frame, orient="vertical", command=self.equipment_tree.yview, style="Custom.Vertical.TScrollbar")
         equipment_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.equipment_tree.configure(yscrollcommand=equipment_scrollbar.set)
+        self.equipment_tree.tag_configure('profit', background='#1e3f20')
+        self.equipment_tree.tag_configure('loss', background='#3f1e1e')
 
         # Ingredients and Intermediate Items frame
         ingredients_intermediate_frame = ttk.Frame(self.main_frame, style='TFrame')
@@ -160,7 +351,7 @@ class StyledDofusCraftimizerUI:
 
         ingredients_scrollbar = ttk.Scrollbar(ingredients_frame, orient="vertical", command=self.ingredients_tree.yview, style="Custom.Vertical.TScrollbar")
         ingredients_scrollbar.grid(row=0, column=1, sticky="ns")
-        self.ingredients_tree.configure(yscrollcommand=ingredients_scrollbar.set)
+        self.ingredients_rows = VirtualRows(self.ingredients_tree, ingredients_scrollbar, key=lambda values: values[0])
 
         # Intermediate items frame
         intermediate_frame = ttk.LabelFrame(ingredients_intermediate_frame, text="Intermediate Items", style='Card.TLabelframe')
@@ -181,7 +372,7 @@ class StyledDofusCraftimizerUI:
 
         intermediate_scrollbar = ttk.Scrollbar(intermediate_frame, orient="vertical", command=self.intermediate_tree.yview, style="Custom.Vertical.TScrollbar")
         intermediate_scrollbar.grid(row=0, column=1, sticky="ns")
-        self.intermediate_tree.configure(yscrollcommand=intermediate_scrollbar.set)
+        self.intermediate_rows = VirtualRows(self.intermediate_tree, intermediate_scrollbar, key=lambda values: values[0])
 
         # Bind events
         self.equipment_tree.bind("<Double-1>", self.on_equipment_double_click)
@@ -208,19 +399,17 @@ class StyledDofusCraftimizerUI:
     def get_search_query(self):
         return self.search_var.get()
 
-    def insert_equipment(self, ankama_id, values):
-        return self.equipment_tree.insert("", "end", values=values, tags=(ankama_id,))
+    def is_live_search_enabled(self):
+        return self.live_search_var.get()
 
     def clear_results(self):
-        for item in self.results_tree.get_children():
-            self.results_tree.delete(item)
+        self.results_rows.clear()
 
-    def insert_result(self, values, ankama_id):
-        self.results_tree.insert("", "end", values=values, tags=(ankama_id,))
-
-    def populate_results(self, results):
-        for item in results:
-            self.results_tree.insert("", "end", values=(item['name'], item['level'], item['type']), tags=(item['ankama_id'],))
+    def populate_results(self, results, get_clean_type):
+        # Rows are built as they scroll into view, so a huge result set costs one page up front
+        self.results_rows.set_rows(results, lambda item: (
+            (item['name'], item['level'], get_clean_type(item['type'])), (item['ankama_id'],)
+        ))
 
     def get_selected_results(self):
         return self.results_tree.selection()
@@ -231,61 +420,115 @@ class StyledDofusCraftimizerUI:
     def get_result_ankama_id(self, item):
         return self.results_tree.item(item)['tags'][0]
 
-    def insert_equipment(self, item_name, values):
-        item = self.equipment_tree.insert("", "end", values=values, tags=(item_name,))
-        self.update_equipment_row_color(item)
-        return item
-    
-    def update_equipment_row_color(self, item):
-        profit = self.equipment_tree.set(item, "Profit")
-        
-        try:
-            profit_value = int(profit.replace(',', ''))
-            
-            if profit_value > 0:
-                self.equipment_tree.tag_configure('profit', background='#1e3f20')
-                self.equipment_tree.item(item, tags=('profit',))
-            elif profit_value < 0:
-                self.equipment_tree.tag_configure('loss', background='#3f1e1e')
-                self.equipment_tree.item(item, tags=('loss',))
-            else:
-                self.equipment_tree.item(item, tags=())
-        except ValueError:
-            # If profit is not a valid number, don't apply any color
-            self.equipment_tree.item(item, tags=())
-        
-    def get_equipment_children(self):
-        return self.equipment_tree.get_children()
-
-    def get_equipment_item_tags(self, item):
-        return self.equipment_tree.item(item)['tags']
+    def insert_equipment(self, key):
+        # Rows use the plan's entry key as their item id; render fills them in
+        return self.equipment_tree.insert("", "end", iid=key)
 
-    def set_equipment_value(self, item, column, value):
-        self.equipment_tree.set(item, column, value)
-
-    def get_equipment_value(self, item, column):
-        return self.equipment_tree.set(item, column)
+    def set_equipment_row(self, key, values, profit):
+        self.equipment_tree.item(key, values=values, tags=('profit',) if profit > 0 else ('loss',) if profit < 0 else ())
 
     def clear_ingredients(self):
-        for item in self.ingredients_tree.get_children():
-            self.ingredients_tree.delete(item)
+        self.ingredients_rows.clear()
 
-    def insert_ingredient(self, values):
-        item = self.ingredients_tree.insert("", "end", values=values)
-        if values[3] == 'Intermediate':  # Assuming the type is the fourth value
-            self.ingredients_tree.item(item, tags=('intermediate',))
-        return item
+    def populate_ingredients(self, rows):
+        # Patched in place by name; the type is the fourth value
+        self.ingredients_rows.patch_rows(rows, lambda values: (values, ('intermediate',) if values[3] == 'Intermediate' else ()))
 
     def clear_intermediate_items(self):
-        for item in self.intermediate_tree.get_children():
-            self.intermediate_tree.delete(item)
-
-    def insert_intermediate_item(self, values):
-        self.intermediate_tree.insert("", "end", values=values)
-
-    def set_equipment_tags(self, item, tags):
-        self.equipment_tree.item(item, tags=tags)
-        self.update_equipment_row_color(item)
+        self.intermediate_rows.clear()
+
+    def populate_intermediate_items(self, rows):
+        self.intermediate_rows.patch_rows(rows, lambda values: (values, ()))
+
+    def set_intermediate_value(self, name, column, value):
+        self.intermediate_rows.set_value(name, column, value)
+
+    def show_make_or_buy_plan(self, plan, format_number):
+        window = tk.Toplevel(self.master)
+        window.title("Make or Buy")
+        window.configure(background='#141414')
+        frame = ttk.Frame(window, padding="10 10 10 10", style='TFrame')
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        columns = ("Name", "Decision", "Market Price", "Craft Cost")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", style='Treeview')
+        for column in columns:
+            tree.heading(column, text=column)
+        tree.column("Name", width=200)
+        tree.column("Decision", width=90, anchor=tk.CENTER)
+        tree.column("Market Price", width=120, anchor=tk.E)
+        tree.column("Craft Cost", width=120, anchor=tk.E)
+        tree.pack(expand=True, fill=tk.BOTH)
+
+        # Only items with a known market price are a real choice
+        decisions = sorted((item for item in plan['decisions'].items() if item[1]['market_price'] is not None),
+                           key=lambda item: item[0])
+        for name, decision in decisions:
+            tree.insert("", "end", values=(
+                name,
+                decision['action'].capitalize(),
+                format_number(int(decision['market_price'])),
+                format_number(int(decision['craft_cost']))
+            ))
+
+        ttk.Label(frame, text=f"Savings over the current plan: {format_number(int(plan['savings']))}").pack(pady=(10, 5))
+
+        def apply():
+            window.destroy()
+            self.controller.apply_make_or_buy_plan(plan)
+
+        buttons = ttk.Frame(frame, style='TFrame')
+        buttons.pack(fill=tk.X)
+        ttk.Button(buttons, text="Apply", command=apply).pack(side=tk.RIGHT)
+        ttk.Button(buttons, text="Close", command=window.destroy).pack(side=tk.RIGHT, padx=(0, 5))
+
+    def ask_price_file(self):
+        return filedialog.askopenfilename(parent=self.master, title="Import Prices", filetypes=[
+            ("Price files", "*.csv *.jsonl *.json"), ("All files", "*.*")
+        ])
+
+    def show_price_risk(self, run, format_number):
+        # run(spread) returns (name, amount, p10, p50, p90, loss probability) rows; spread is a fraction of each price
+        window = tk.Toplevel(self.master)
+        window.title("Price Risk")
+        window.configure(background='#141414')
+        frame = ttk.Frame(window, padding="10 10 10 10", style='TFrame')
+        frame.pack(expand=True, fill=tk.BOTH)
+
+        columns = ("Name", "Amount", "P10 Profit", "Median Profit", "P90 Profit", "Loss Chance")
+        tree = ttk.Treeview(frame, columns=columns, show="headings", style='Treeview')
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=110, anchor=tk.E)
+        tree.column("Name", width=200, anchor=tk.W)
+        tree.column("Amount", width=70, anchor=tk.CENTER)
+        tree.pack(expand=True, fill=tk.BOTH)
+
+        controls = ttk.Frame(frame, style='TFrame')
+        controls.pack(fill=tk.X, pady=(10, 0))
+        ttk.Label(controls, text="Price spread (%)").pack(side=tk.LEFT)
+        spread_var = tk.StringVar(value="20")
+        ttk.Entry(controls, textvariable=spread_var, width=6).pack(side=tk.LEFT, padx=(5, 0))
+
+        def refresh(event=None):
+            try:
+                spread = max(0.0, float(spread_var.get())) / 100
+            except ValueError:
+                return
+            tree.delete(*tree.get_children())
+            for name, amount, p10, p50, p90, loss_probability in run(spread):
+                tags = ('loss',) if loss_probability >= 0.5 else ('profit',) if p10 > 0 else ()
+                tree.insert("", "end", tags=tags, values=(
+                    name, amount, format_number(int(p10)), format_number(int(p50)), format_number(int(p90)),
+                    f"{loss_probability:.0%}"
+                ))
+
+        tree.tag_configure('profit', background='#1e3f20')
+        tree.tag_configure('loss', background='#3f1e1e')
+        ttk.Button(controls, text="Close", command=window.destroy).pack(side=tk.RIGHT)
+        ttk.Button(controls, text="Run", command=refresh).pack(side=tk.RIGHT, padx=(0, 5))
+        window.bind('<Return>', refresh)
+        refresh()
 
     def create_edit_entry(self, parent, item, column):
         x, y, width, height = parent.bbox(item, column)
@@ -329,7 +572,7 @@ class StyledDofusCraftimizerUI:
             entry.destroy()
             if new_value.strip() == '':
                 new_value = '0'
-            tree.set(item, column, new_value)
+            self.set_tree_item_value(tree, item, column, new_value)
             self.controller.update_item(tree, item, column, new_value)
 
         entry = ttk.Entry(tree, width=width//8)
@@ -343,6 +586,11 @@ class StyledDofusCraftimizerUI:
         return tree.item(item)['values']
 
     def set_tree_item_value(self, tree, item, column, value):
+        # Patched tables track their cells, so edits go through them
+        for rows in (self.ingredients_rows, self.intermediate_rows):
+            if rows.tree is tree and item in rows.item_keys:
+                rows.set_value(rows.item_keys[item], column, value)
+                return
         tree.set(item, column, value)
 
     def get_tree_children(self, tree):
@@ -1,16 +1,45 @@
 # utils.py
 
+import unicodedata
+
 def process_recipe(recipe, amount=1):
     ingredients = []
-    for item in recipe:
-        ankama_id = item['item_ankama_id']
-        quantity = item['quantity']
-        item_subtype = item['item_subtype']
-        
+    # recipe is an ItemRecord's PackedRecipe of (ankama_id, quantity, item_subtype)
+    for ankama_id, quantity, item_subtype in recipe:
         if ankama_id is not None:
             ingredients.append({
                 "ankama_id": ankama_id,
                 "amount": quantity * amount,
                 "type": item_subtype
             })
-    return ingredients
\ No newline at end of file
+    return ingredients
+
+def normalize_name(name):
+    # Case- and accent-insensitive key, so 'Épée du Bouftou' and 'epee du bouftou' name the same item
+    decomposed = unicodedata.normalize('NFKD', name.casefold())
+    return ' '.join(''.join(char for char in decomposed if not unicodedata.combining(char)).split())
+
+class StatsCache:
+    # Unbounded memo tied to one catalog version, with hit/miss counters that survive invalidation
+    def __init__(self):
+        self.entries = {}
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version, load):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+        if key in self.entries:
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        value = self.entries[key] = load(key)
+        return value
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries), 'version': self.version}